@@ -1,43 +1,496 @@
 # file: api.py
 
-from fastapi import FastAPI, HTTPException
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import signal
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 
+from core import metrics, profiler
 from core.scheduler import AppointmentScheduler
+from core.schemas import MAX_BATCH_SIZE, AppointmentBatchRequest, AppointmentRequest
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # optional: the standard library encoder gives the same bytes, slower
+
+# 'json' (default) rewrites appointments.json on every change,
+# 'journal' appends to a write-ahead log and compacts in the background,
+# 'sqlite' stores everything in data/appointments.db with indexed queries;
+# it is the only mode that several workers (uvicorn --workers N) can share.
+STORAGE_MODE = os.getenv("SCHEDULER_STORAGE", "json")
+# Load only today's and later appointments at startup; past months are read
+# from data/history/ when a request needs them (json and journal modes).
+LAZY_HISTORY = os.getenv("SCHEDULER_LAZY_HISTORY", "0").lower() in ("1", "true", "yes")
+# Seconds between automatic archive runs (moving appointments before today
+# into data/history/); 0 turns it off. POST /archive runs it on demand.
+ARCHIVE_INTERVAL = float(os.getenv("SCHEDULER_ARCHIVE_INTERVAL", "0"))
+# Seconds between keep-alive comments on an idle /events stream
+EVENTS_KEEPALIVE = float(os.getenv("SCHEDULER_EVENTS_KEEPALIVE", "15"))
+# Memory for encoded list responses of the current data version (bytes)
+RESPONSE_CACHE_BYTES = int(os.getenv("SCHEDULER_RESPONSE_CACHE_BYTES", str(64 * 2 ** 20)))
+# Enables GET /debug/profile (sampling profiler) for diagnosing a live server
+PROFILING = os.getenv("SCHEDULER_PROFILING", "0").lower() in ("1", "true", "yes")
+
+scheduler = AppointmentScheduler(data_folder='data', storage_mode=STORAGE_MODE, lazy_history=LAZY_HISTORY)
+
+def end_streams_on_exit():
+    """
+    Uvicorn waits for open responses before it shuts the app down, so
+    /events streams would hold up every shutdown. Its exit signal handlers
+    are wrapped to close the change feed first, which ends the streams.
+    """
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            continue
+
+        def handler(signum, frame, previous=previous):
+            scheduler.events.close()
+            previous(signum, frame)
+
+        try:
+            signal.signal(sig, handler)
+        except ValueError:
+            return  # not the main thread (e.g. under TestClient)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    end_streams_on_exit()
+    if ARCHIVE_INTERVAL > 0:
+        scheduler.start_archiver(ARCHIVE_INTERVAL)
+    yield
+    # Make sure journaled writes reach the disk before exiting
+    scheduler.close()
 
 app = FastAPI(
     title="Appointment Scheduling API",
     description="An API to manage doctor appointments.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-scheduler = AppointmentScheduler(data_folder='data')
+# --- Request metrics ---
+REQUEST_SECONDS = metrics.histogram(
+    'http_request_duration_seconds', 'Time to handle a request, from parsed headers to response.',
+    ['method', 'route']
+)
+ENDPOINT_SECONDS = metrics.histogram(
+    'http_endpoint_seconds', 'Time spent in the endpoint function itself.', ['method', 'route']
+)
+FRAMEWORK_SECONDS = metrics.histogram(
+    'http_framework_seconds', 'Time outside the endpoint: request validation, response_model checks and serialization.',
+    ['method', 'route']
+)
+REQUESTS = metrics.counter(
+    'http_requests_total', 'Requests handled, by status code.', ['method', 'route', 'status']
+)
 
-# --- Pydantic Models for Input/Output ---
-class AppointmentRequest(BaseModel):
-    doctor_id: int
-    patient_name: str
-    phone_number: str # <-- NEW
-    datetime: str = Field(..., example="2025-11-20T14:30:00")
+# Seconds the current request spent inside its endpoint function
+_endpoint_time = contextvars.ContextVar('endpoint_time')
+
+def _add_endpoint_time(seconds):
+    spent = _endpoint_time.get(None)
+    if spent is not None:
+        spent.append(seconds)
+
+def timed_endpoint(endpoint):
+    """Wraps an endpoint to measure its own run time, keeping it sync or async."""
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _add_endpoint_time(time.perf_counter() - started)
+    else:
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                _add_endpoint_time(time.perf_counter() - started)
+    return timed
+
+class TimedRoute(APIRoute):
+    """
+    Records every request into the metrics above, splitting the endpoint's
+    own time from what FastAPI spends around it. Routes are labelled by
+    their path template, e.g. /appointments/{appointment_id}.
+    """
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, timed_endpoint(endpoint), **kwargs)
 
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        route = self.path
+
+        async def timed_handler(request):
+            # Sync endpoints run on the threadpool with a copy of this
+            # context, so they append to the same list
+            spent = []
+            _endpoint_time.set(spent)
+            status = 500
+            started = time.perf_counter()
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            except HTTPException as e:
+                status = e.status_code
+                raise
+            except RequestValidationError:
+                status = 422
+                raise
+            finally:
+                total = time.perf_counter() - started
+                REQUEST_SECONDS.observe(total, method=request.method, route=route)
+                REQUESTS.inc(method=request.method, route=route, status=str(status))
+                if spent:
+                    ENDPOINT_SECONDS.observe(sum(spent), method=request.method, route=route)
+                    FRAMEWORK_SECONDS.observe(max(total - sum(spent), 0.0), method=request.method, route=route)
+
+        return timed_handler
+
+app.router.route_class = TimedRoute
+
+# --- Pydantic Models for Input/Output ---
 class AppointmentResponse(AppointmentRequest):
     appointment_id: str
     status: str
 
+class RescheduleRequest(BaseModel):
+    datetime: str = Field(..., example="2025-11-21T09:00:00")
+
+class BookingResult(BaseModel):
+    success: bool
+    message: str
+    appointment: Optional[AppointmentResponse] = None
+
+class AppointmentBatchResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BookingResult]
+
+class CancelBatchRequest(BaseModel):
+    appointment_ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class CancelResult(BaseModel):
+    appointment_id: str
+    success: bool
+    message: str
+
+class CancelBatchResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[CancelResult]
+
+# --- Conditional GET helpers ---
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Returns a 304 response if the client already holds this version."""
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+# --- Pre-encoded responses ---
+# List endpoints skip response_model validation, which costs more than
+# encoding: rows come from the scheduler's own records and are built in
+# AppointmentResponse's shape directly. The declared response_model still
+# documents them in the OpenAPI schema.
+def encode_json(data) -> bytes:
+    """The same compact UTF-8 JSON as FastAPI's JSONResponse."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def appointment_row(appt) -> dict:
+    # Same keys, in the same order, as AppointmentResponse
+    return {
+        "doctor_id": appt.doctor_id,
+        "patient_name": appt.patient_name,
+        "phone_number": appt.phone_number,
+        "datetime": appt.datetime,
+        "appointment_id": appt.appointment_id,
+        "status": appt.status
+    }
+
+def encode_appointments(appointments) -> bytes:
+    return encode_json([appointment_row(appt) for appt in appointments])
+
+class ResponseCache:
+    """
+    Encoded bodies for one data version, by request path and query, least
+    recently used first out once they exceed `max_bytes`. Looking up or
+    storing a different version (the ETag) drops everything older, so a
+    write invalidates all of them at once.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._etag = None
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, etag, key):
+        with self._lock:
+            if etag != self._etag:
+                return None
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, etag, key, body, headers):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if etag != self._etag:
+                self._etag = etag
+                self._entries.clear()
+                self._size = 0
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[0])
+            self._entries[key] = (body, headers)
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+response_cache = ResponseCache(RESPONSE_CACHE_BYTES)
+
+def appointment_list(request: Request, etag: str, query) -> Response:
+    """
+    Serves an appointment list from response_cache, or runs `query` (which
+    returns (appointments, next_cursor)) and caches its encoded result.
+    """
+    key = f"{request.url.path}?{request.url.query}"
+    cached = response_cache.get(etag, key)
+    if cached is None:
+        try:
+            appointments, next_cursor = query()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        headers = {"ETag": etag}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        cached = (encode_appointments(appointments), headers)
+        response_cache.put(etag, key, *cached)
+    body, headers = cached
+    return Response(body, media_type="application/json", headers=headers)
+
+@functools.lru_cache(maxsize=1)
+def encoded_doctors(etag: str) -> bytes:
+    return encode_json(scheduler.get_all_doctors())
+
 # --- API Endpoints ---
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Appointment Scheduling API"}
 
+@app.get("/version")
+def get_data_version():
+    """Current data version; it increases with every add or cancel."""
+    return {"version": scheduler.data_version, "etag": scheduler.appointments_etag}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Request, scheduler and storage metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+def get_profile(
+    seconds: float = Query(10, gt=0, le=120, description="How long to sample"),
+    interval_ms: float = Query(5, ge=1, le=1000, description="Time between samples")
+):
+    """
+    Samples every thread's stack for `seconds` and returns the collapsed
+    stacks (flamegraph.pl / speedscope input). Only available when the API
+    runs with SCHEDULER_PROFILING=1.
+    """
+    if not PROFILING:
+        raise HTTPException(status_code=404, detail="Profiling is disabled; set SCHEDULER_PROFILING=1.")
+    stacks = profiler.profile(seconds, interval_ms / 1000)
+    if stacks is None:
+        raise HTTPException(status_code=409, detail="A profile is already running.")
+    return PlainTextResponse(stacks)
+
+@app.get("/changes")
+def get_changes(since: str = Query(..., description="Event id to continue from: an ETag without quotes, or last_event_id")):
+    """
+    Appointment changes after `since`, as applied by followers instead of
+    re-downloading everything. Returns 410 when they can't be replayed (API
+    restarted, or too far behind); reload GET /appointments then.
+    """
+    result = scheduler.changes_since(since)
+    if result is None:
+        raise HTTPException(status_code=410, detail="Changes since this event are no longer available; reload.")
+    events, last_event_id = result
+    return {"last_event_id": last_event_id, "events": events}
+
+def sse_message(event_type: str, event_id: str, data) -> str:
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/events")
+async def stream_events(
+    request: Request,
+    since: Optional[str] = Query(None, description="Event id to resume after; default: only new events"),
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Server-sent events for every change: `appointments` (created
+    appointments and cancelled ids of one commit) and `archived`. Each
+    message id resumes the stream via Last-Event-ID or `since`; when that
+    is no longer possible a `reset` event tells the client to reload.
+    """
+    loop = asyncio.get_running_loop()
+    wakeup = asyncio.Event()
+
+    def notify():
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            pass  # event loop already closed
+
+    async def messages():
+        token = last_event_id or since or scheduler.change_token
+        scheduler.events.subscribe(notify)
+        try:
+            while not scheduler.events.closed and not await request.is_disconnected():
+                wakeup.clear()
+                result = scheduler.changes_since(token)
+                if result is None:
+                    token = scheduler.change_token
+                    yield sse_message("reset", token, {"last_event_id": token})
+                    continue
+                events, latest = result
+                for event in events:
+                    yield sse_message(event["type"], f"{scheduler.instance_id}-{event['seq']}", event)
+                token = latest
+                if scheduler.events.closed:
+                    break
+                try:
+                    await asyncio.wait_for(wakeup.wait(), EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            scheduler.events.unsubscribe(notify)
+
+    return StreamingResponse(messages(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
 @app.get("/doctors")
-def get_doctors():
-    return scheduler.get_all_doctors()
+def get_doctors(request: Request):
+    etag = scheduler.doctors_etag
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    return Response(encoded_doctors(etag), media_type="application/json", headers={"ETag": etag})
+
+@app.get("/doctors/{doctor_id}/availability")
+def get_doctor_availability(
+    doctor_id: int,
+    start: Optional[str] = Query(None, description="Start of the search (inclusive), ISO format; default now"),
+    end: Optional[str] = Query(None, description="End of the search (exclusive), ISO format; default start + 7 days"),
+    step_minutes: int = Query(30, ge=1, le=240),
+    day_start: str = Query("09:00", description="Clinic opening time, HH:MM"),
+    day_end: str = Query("17:00", description="Clinic closing time, HH:MM")
+):
+    """Lists every bookable slot for one doctor in a single call."""
+    if scheduler.get_doctor(doctor_id) is None:
+        raise HTTPException(status_code=404, detail="Error: Doctor ID not found.")
+    try:
+        return scheduler.find_available_slots(
+            doctor_id=doctor_id, start=start, end=end,
+            step_minutes=step_minutes, day_start=day_start, day_end=day_end
+        )[0]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/availability")
+def get_availability(
+    specialty: Optional[str] = Query(None, description="Only doctors of this specialty; default all doctors"),
+    start: Optional[str] = Query(None, description="Start of the search (inclusive), ISO format; default now"),
+    end: Optional[str] = Query(None, description="End of the search (exclusive), ISO format; default start + 7 days"),
+    step_minutes: int = Query(30, ge=1, le=240),
+    day_start: str = Query("09:00", description="Clinic opening time, HH:MM"),
+    day_end: str = Query("17:00", description="Clinic closing time, HH:MM")
+):
+    """Lists bookable slots for every doctor, optionally of one specialty."""
+    try:
+        return scheduler.find_available_slots(
+            specialty=specialty, start=start, end=end,
+            step_minutes=step_minutes, day_start=day_start, day_end=day_end
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/stats")
+def get_stats():
+    """
+    Dashboard totals (upcoming, today, this_week, completed) and each
+    doctor's upcoming count. No ETag: the counts move as time passes.
+    """
+    return scheduler.get_stats()
 
 @app.get("/appointments", response_model=List[AppointmentResponse])
-def get_all_appointments():
-    return scheduler.get_all_appointments()
+def get_all_appointments(
+    request: Request,
+    doctor_id: Optional[int] = None,
+    start: Optional[str] = Query(None, description="Earliest datetime (inclusive), ISO format"),
+    end: Optional[str] = Query(None, description="Latest datetime (exclusive), ISO format"),
+    phone_number: Optional[str] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header from the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="Page size; omit for everything"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="'ndjson' streams one appointment per line")
+):
+    """
+    Lists appointments in time order, optionally filtered and paginated.
+    When more results exist, the cursor for the next page is returned in the
+    X-Next-Cursor header. Responses carry an ETag; send it back in
+    If-None-Match to get a 304 when nothing has changed.
+    """
+    # Read the version before the data: a concurrent write can then only
+    # make the ETag older than the body, never newer.
+    etag = scheduler.appointments_etag
+    filters = dict(doctor_id=doctor_id, start=start, end=end, phone_number=phone_number, status=status)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    if format == "ndjson":
+        # Query up front: errors can't be reported once streaming starts
+        try:
+            page, next_cursor = scheduler.query_appointments(cursor=cursor, limit=limit or 1, **filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        headers = {"ETag": etag}
+        if limit:
+            if next_cursor:
+                headers["X-Next-Cursor"] = next_cursor
+            rows = page
+        else:
+            rows = scheduler.iter_appointments(cursor=cursor, **filters)
+        lines = (encode_json(appointment_row(appt)) + b"\n" for appt in rows)
+        return StreamingResponse(lines, media_type="application/x-ndjson", headers=headers)
+
+    return appointment_list(
+        request, etag, lambda: scheduler.query_appointments(cursor=cursor, limit=limit, **filters)
+    )
 
 @app.post("/appointments", status_code=201, response_model=AppointmentResponse)
 def add_new_appointment(request: AppointmentRequest):
@@ -50,7 +503,34 @@ def add_new_appointment(request: AppointmentRequest):
     )
     if not success:
         raise HTTPException(status_code=409, detail=message) # 409 Conflict
-    return new_appt
+    return new_appt.to_dict()
+
+@app.post("/appointments/batch", response_model=AppointmentBatchResponse)
+def add_appointment_batch(request: AppointmentBatchRequest):
+    """
+    Schedules several appointments with one write to disk. Each item is
+    validated like POST /appointments, also against earlier items in the
+    same batch, and gets its own result; failed items don't stop the rest.
+    """
+    outcomes = scheduler.add_appointments([appt.model_dump() for appt in request.appointments])
+    results = [
+        {"success": success, "message": message, "appointment": appt.to_dict() if appt else None}
+        for success, message, appt in outcomes
+    ]
+    succeeded = sum(1 for result in results if result["success"])
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+# Declared before /appointments/{appointment_id} so "batch" isn't taken as an ID
+@app.delete("/appointments/batch", response_model=CancelBatchResponse)
+def cancel_appointment_batch(request: CancelBatchRequest):
+    """Cancels several appointments with one write to disk."""
+    outcomes = scheduler.cancel_appointments(request.appointment_ids)
+    results = [
+        {"appointment_id": appointment_id, "success": success, "message": message}
+        for appointment_id, (success, message) in zip(request.appointment_ids, outcomes)
+    ]
+    succeeded = sum(1 for result in results if result["success"])
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
 
 @app.delete("/appointments/{appointment_id}", status_code=200)
 def cancel_an_appointment(appointment_id: str):
@@ -58,4 +538,56 @@ def cancel_an_appointment(appointment_id: str):
     success, message = scheduler.cancel_appointment(appointment_id)
     if not success:
         raise HTTPException(status_code=404, detail=message) # 404 Not Found
-    return {"message": message}
\ No newline at end of file
+    return {"message": message}
+
+@app.patch("/appointments/{appointment_id}", response_model=AppointmentResponse)
+def reschedule_an_appointment(appointment_id: str, request: RescheduleRequest):
+    """
+    Moves an appointment to a new time in one step. The new time must pass
+    the booking rules; the appointment's current slot doesn't count as a
+    conflict and is kept until the move succeeds.
+    """
+    success, message, appt = scheduler.reschedule_appointment(appointment_id, request.datetime)
+    if not success:
+        raise HTTPException(status_code=404 if appt is None else 409, detail=message)
+    return appt.to_dict()
+
+# --- Archive and history ---
+@app.post("/archive")
+def archive_past_appointments(
+    before: Optional[str] = Query(None, description="Archive appointments before this ISO datetime; default start of today")
+):
+    """Moves past appointments out of memory into month partitions under data/history/."""
+    try:
+        archived = scheduler.archive_past(before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"archived": archived, "months": scheduler.history_months()}
+
+@app.get("/history/months")
+def get_history_months():
+    """Months ('YYYY-MM') that have archived appointments, oldest first."""
+    return scheduler.history_months()
+
+@app.get("/history", response_model=List[AppointmentResponse])
+def get_history(
+    request: Request,
+    month: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$", description="Only this month, YYYY-MM"),
+    doctor_id: Optional[int] = None,
+    phone_number: Optional[str] = None,
+    status: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor header from the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="Page size; omit for everything")
+):
+    """
+    Lists archived appointments in time order, reading only the month
+    partitions it needs. Paging and ETags work as for GET /appointments.
+    """
+    etag = scheduler.appointments_etag
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    return appointment_list(request, etag, lambda: scheduler.query_history(
+        month=month, doctor_id=doctor_id, phone_number=phone_number,
+        status=status, cursor=cursor, limit=limit
+    ))
@@ -0,0 +1,69 @@
+# file: benchmarks/bench_batch.py
+#
+# Compares importing a day list one POST at a time with a single batch call.
+# Run from the repository root:
+#
+#     python -m benchmarks.bench_batch [history] [items]
+#
+# Both runs go through AppointmentScheduler on the same synthetic history,
+# once per storage mode. "single" calls add_appointment for every item (one
+# commit each); "batch" calls add_appointments once (one commit in total).
+
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+from benchmarks.common import DOCTORS, make_dataset
+from core.scheduler import AppointmentScheduler
+from core.storage import STORAGE_MODES
+
+HISTORY = 20_000
+ITEMS = 200
+
+
+def day_list(end, items):
+    return [
+        {
+            "doctor_id": n % DOCTORS + 1,
+            "patient_name": f"Import {n}",
+            "datetime": (end + timedelta(days=1, minutes=30 * (n // DOCTORS))).isoformat(timespec='minutes'),
+            "phone_number": f"777-{n:07d}",
+        }
+        for n in range(items)
+    ]
+
+
+def run(mode, history, items, batch):
+    with tempfile.TemporaryDirectory() as folder:
+        _, end = make_dataset(folder, history)
+        scheduler = AppointmentScheduler(data_folder=folder, storage_mode=mode)
+        requests = day_list(end, items)
+        started = time.perf_counter()
+        if batch:
+            results = scheduler.add_appointments(requests)
+        else:
+            results = [
+                scheduler.add_appointment(r["doctor_id"], r["patient_name"], r["datetime"], r["phone_number"])
+                for r in requests
+            ]
+        scheduler.close()
+        elapsed = time.perf_counter() - started
+    assert all(success for success, _, _ in results)
+    return elapsed * 1000
+
+
+def main():
+    history = int(sys.argv[1]) if len(sys.argv) > 1 else HISTORY
+    items = int(sys.argv[2]) if len(sys.argv) > 2 else ITEMS
+    print(f"{items} bookings on top of {history:,} appointments, total milliseconds")
+    print(f"{'mode':>8} | {'single':>10} | {'batch':>10}")
+    print("-" * 34)
+    for mode in STORAGE_MODES:
+        single = run(mode, history, items, batch=False)
+        batch = run(mode, history, items, batch=True)
+        print(f"{mode:>8} | {single:>10.1f} | {batch:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# file: benchmarks/bench_booking.py
+#
+# Micro-benchmark for booking latency as appointment history grows.
+# Run from the repository root:
+#
+#     python -m benchmarks.bench_booking
+#
+# For every size it reports the 30-minute conflict check on its own (the old
+# linear scan vs. the per-doctor bisect index) and a full add_appointment
+# call, which also includes validation and persisting the JSON file.
+
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import DOCTORS, make_dataset  # noqa: E402
+from core.scheduler import AppointmentScheduler, to_timestamp  # noqa: E402
+
+SIZES = (1_000, 10_000, 100_000)
+CHECKS = 200
+BOOKINGS = 20
+
+
+def legacy_is_conflict(appointments, doctor_id, dt_string):
+    """The original implementation: parse and compare every appointment."""
+    new_dt = datetime.fromisoformat(dt_string)
+    gap = timedelta(minutes=29)
+    for appt in appointments:
+        if appt['doctor_id'] == doctor_id:
+            existing_dt = datetime.fromisoformat(appt['datetime'])
+            if existing_dt - gap <= new_dt <= existing_dt + gap:
+                return True
+    return False
+
+
+def per_call_us(fn, calls):
+    started = time.perf_counter()
+    for args in calls:
+        fn(*args)
+    return (time.perf_counter() - started) / len(calls) * 1e6
+
+
+def run(size, rng):
+    with tempfile.TemporaryDirectory() as folder:
+        start, end = make_dataset(folder, size)
+        scheduler = AppointmentScheduler(data_folder=folder)
+        span = int((end - start).total_seconds() // 60)
+
+        probes = []
+        for _ in range(CHECKS):
+            dt = start + timedelta(minutes=rng.randrange(span))
+            probes.append((rng.randint(1, DOCTORS), dt.isoformat(timespec='minutes')))
+
+        # The original in-memory form: a list of plain dicts
+        legacy_rows = [appt.to_dict() for appt in scheduler.storage.appointments]
+        legacy = per_call_us(
+            lambda doctor_id, dt: legacy_is_conflict(legacy_rows, doctor_id, dt),
+            probes[:max(1, CHECKS // 10)]
+        )
+        indexed = per_call_us(
+            lambda doctor_id, dt: scheduler._is_conflict(doctor_id, to_timestamp(datetime.fromisoformat(dt))),
+            probes
+        )
+
+        # Book strictly after the synthetic history so every call succeeds.
+        bookings = [
+            (1, "Bench Patient", (end + timedelta(hours=i)).isoformat(timespec='minutes'), f"999-{i:07d}")
+            for i in range(BOOKINGS)
+        ]
+        add = per_call_us(scheduler.add_appointment, bookings)
+
+    print(f"{size:>8,} | {legacy:>14,.1f} | {indexed:>14,.2f} | {add / 1000:>14,.2f}")
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'rows':>8} | {'scan check us':>14} | {'index check us':>14} | {'add_appt ms':>14}")
+    print("-" * 62)
+    for size in SIZES:
+        run(size, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# file: benchmarks/bench_mcp_client.py
+#
+# Measures MCP tool-call latency and throughput against a local stub API.
+# Run from the repository root:
+#
+#     python -m benchmarks.bench_mcp_client [calls] [concurrency]
+#
+# "before" replays the old tool behaviour: a blocking request with a fresh
+# connection per call, one call at a time (sync tools block the MCP event
+# loop, so parallel calls from an agent serialize). "after" calls the async
+# tools in server/main.py, which share one keep-alive client, first one at a
+# time and then `concurrency` calls in flight.
+
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CALLS = 200
+CONCURRENCY = 16
+# Simulated server-side work per request (seconds)
+API_DELAY = 0.005
+
+DOCTORS = json.dumps([
+    {"doctor_id": i, "name": f"Dr. Stub {i}", "specialty": "General"} for i in range(1, 5)
+]).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one segment so keep-alive connections don't
+    # stall on delayed ACKs.
+    disable_nagle_algorithm = True
+    wbufsize = 64 * 1024
+
+    def do_GET(self):
+        time.sleep(API_DELAY)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(DOCTORS)))
+        self.end_headers()
+        self.wfile.write(DOCTORS)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def summarize(label, latencies, elapsed):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:>28} | {statistics.mean(latencies) * 1000:>8.2f} | {p95 * 1000:>8.2f} | "
+          f"{len(latencies) / elapsed:>8.1f}")
+
+
+def run_before(base_url, calls):
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(calls):
+        t = time.perf_counter()
+        # A fresh TCP connection per call, like the old requests.get()
+        with urllib.request.urlopen(f"{base_url}/doctors") as r:
+            json.loads(r.read())
+        latencies.append(time.perf_counter() - t)
+    return latencies, time.perf_counter() - started
+
+
+async def run_after(calls, concurrency):
+    from server import main as mcp_server
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one_call():
+        async with semaphore:
+            t = time.perf_counter()
+            result = await mcp_server.fetch_doctors()
+            latencies.append(time.perf_counter() - t)
+            assert isinstance(result["result"], list), result
+
+    await mcp_server.fetch_doctors()  # warm up the pool
+    started = time.perf_counter()
+    await asyncio.gather(*(one_call() for _ in range(calls)))
+    elapsed = time.perf_counter() - started
+    await mcp_server.close_client()
+    return latencies, elapsed
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else CALLS
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else CONCURRENCY
+
+    stub = start_stub()
+    base_url = f"http://127.0.0.1:{stub.server_port}"
+    os.environ["API_BASE_URL"] = base_url
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    print(f"{calls} fetch_doctors calls, stub API delay {API_DELAY * 1000:.0f} ms")
+    print(f"{'mode':>28} | {'mean ms':>8} | {'p95 ms':>8} | {'calls/s':>8}")
+    print("-" * 62)
+    summarize("before (sync, no pool)", *run_before(base_url, calls))
+    summarize("after (async, 1 in flight)", *asyncio.run(run_after(calls, 1)))
+    summarize(f"after (async, {concurrency} in flight)", *asyncio.run(run_after(calls, concurrency)))
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
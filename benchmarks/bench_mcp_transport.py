@@ -0,0 +1,90 @@
+# file: benchmarks/bench_mcp_transport.py
+#
+# Compares MCP tool latency for the two transports in server/main.py:
+# "http" against api.py served by uvicorn on localhost, with the read cache
+# TTLs set to 0 so every call reaches the API, and "inprocess" calling
+# AppointmentScheduler directly. Run from the repository root:
+#
+#     python -m benchmarks.bench_mcp_transport [appointments] [calls]
+
+import asyncio
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from benchmarks.common import REPO_ROOT, make_dataset, start_api, stop
+
+APPOINTMENTS = 1_000
+CALLS = 200
+
+
+async def measure(mcp_server, end, calls):
+    async def timed(fn, *args):
+        latencies = []
+        for _ in range(calls):
+            t = time.perf_counter()
+            await fn(*args)
+            latencies.append(time.perf_counter() - t)
+        return statistics.mean(latencies) * 1000
+
+    async def book_and_cancel():
+        slot = end + timedelta(days=1)
+        text = await mcp_server.add_appointment(1, "Bench Patient", "999-0000000", slot.isoformat(timespec='minutes'))
+        appointment_id = text.split("'appointment_id': '")[1].split("'")[0]
+        await mcp_server.cancel_appointment(appointment_id)
+
+    results = {
+        "fetch_doctors": await timed(mcp_server.fetch_doctors),
+        "fetch_appointments(doctor)": await timed(mcp_server.fetch_appointments, 1),
+        "add + cancel": await timed(book_and_cancel),
+    }
+    await mcp_server.close_client()
+    mcp_server.close_transport()
+    return results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else APPOINTMENTS
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else CALLS
+    sys.path.insert(0, str(REPO_ROOT))
+
+    with tempfile.TemporaryDirectory() as folder:
+        http_data = Path(folder) / "http" / "data"
+        local_data = Path(folder) / "inprocess" / "data"
+        http_data.mkdir(parents=True)
+        _, end = make_dataset(http_data, count)
+        shutil.copytree(http_data, local_data)
+
+        process, base_url = start_api(http_data.parent)
+        try:
+            os.environ["API_BASE_URL"] = base_url
+
+            from server import main as mcp_server
+            logging.getLogger("httpx").setLevel(logging.WARNING)
+
+            # No TTL: every timed read reaches the API instead of the MCP read cache
+            mcp_server.DOCTORS_CACHE_TTL = mcp_server.APPOINTMENTS_CACHE_TTL = 0
+            mcp_server.MCP_TRANSPORT = "http"
+            http_results = asyncio.run(measure(mcp_server, end, calls))
+
+            mcp_server.MCP_TRANSPORT = "inprocess"
+            mcp_server.SCHEDULER_DATA_FOLDER = str(local_data)
+            local_results = asyncio.run(measure(mcp_server, end, calls))
+        finally:
+            stop(process)
+
+    print(f"{count:,} appointments, {calls} calls each, mean ms per tool call")
+    print(f"{'tool':>28} | {'http':>8} | {'inprocess':>9}")
+    print("-" * 52)
+    for name in http_results:
+        print(f"{name:>28} | {http_results[name]:>8.3f} | {local_results[name]:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# file: benchmarks/bench_memory.py
+#
+# Resident memory of the in-memory (json mode) scheduler at large sizes.
+# Run from the repository root:
+#
+#     python -m benchmarks.bench_memory [count]
+#
+# "dicts" rebuilds the previous in-memory form, one dict of strings per
+# appointment plus the same indexes; "records" is AppointmentScheduler with
+# core.records.Appointment. Each variant is loaded in a fresh interpreter
+# and reports the bytes still allocated by Python once loading is done
+# (tracemalloc) and the process's peak RSS.
+
+import gc
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+from benchmarks.common import make_dataset
+
+COUNT = 1_000_000
+
+
+def load_dicts(folder):
+    from core.storage import UNKNOWN_TS, load_json_list, parse_timestamp
+
+    by_id = {appt['appointment_id']: appt for appt in load_json_list(f"{folder}/appointments.json")}
+    doctor_slots, phone_slots, order = {}, {}, []
+    for appt in by_id.values():
+        ts = parse_timestamp(appt.get('datetime'))
+        order.append((UNKNOWN_TS if ts is None else ts, appt['appointment_id']))
+        if ts is not None:
+            doctor_slots.setdefault(appt['doctor_id'], []).append(ts)
+            phone_slots.setdefault(appt.get('phone_number'), []).append(ts)
+    order.sort()
+    return by_id, doctor_slots, phone_slots, order
+
+
+def load_records(folder):
+    from core.scheduler import AppointmentScheduler
+
+    return AppointmentScheduler(data_folder=folder)
+
+
+def child(variant, folder):
+    loader = load_dicts if variant == "dicts" else load_records
+    tracemalloc.start()
+    loaded = loader(folder)
+    gc.collect()
+    live, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(json.dumps({"live": live, "peak_rss": peak_rss}))
+    del loaded
+
+
+def measure(variant, folder):
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_memory", "--child", variant, folder],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+        return
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else COUNT
+    with tempfile.TemporaryDirectory() as folder:
+        make_dataset(folder, count)
+        results = {variant: measure(variant, folder) for variant in ("dicts", "records")}
+
+    mb = 1024 * 1024
+    print(f"{count:,} appointments")
+    print(f"{'variant':>8} | {'live MB':>9} | {'bytes/appt':>10} | {'peak RSS MB':>11}")
+    print("-" * 48)
+    for variant, r in results.items():
+        print(f"{variant:>8} | {r['live'] / mb:>9.1f} | {r['live'] / count:>10.0f} | {r['peak_rss'] / mb:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
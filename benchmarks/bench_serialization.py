@@ -0,0 +1,85 @@
+# file: benchmarks/bench_serialization.py
+#
+# Latency of the list endpoints, where encoding the response dominates.
+# Run from the repository root:
+#
+#     python -m benchmarks.bench_serialization [rows,rows,...] [repeats]
+#
+# For each size (default 10k and 100k appointments) the API runs in its own
+# uvicorn process and every request is timed from send to the last byte:
+#   full list       GET /appointments, unchanged data (repeat reads)
+#   after a write   GET /appointments right after a booking and its
+#                   cancellation changed the data version
+#   page            GET /appointments?limit=1000
+#   doctors         GET /doctors
+
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import free_slots, make_dataset, start_api, stop
+
+SIZES = (10_000, 100_000)
+REPEATS = 20
+DOCTORS = 20
+
+
+def timed(fn):
+    t = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t) * 1000
+
+
+def measure(rows, repeats):
+    with tempfile.TemporaryDirectory() as workdir:
+        _, after = make_dataset(Path(workdir) / "data", rows, DOCTORS)
+        process, base_url = start_api(workdir, SCHEDULER_STORAGE="json")
+        try:
+            client = httpx.Client(base_url=base_url, timeout=120)
+
+            def get(path):
+                r = client.get(path)
+                r.raise_for_status()
+                return r
+
+            def write(n):
+                doctor_id, dt_string = free_slots(after, DOCTORS, 1, offset=n)[0]
+                r = client.post("/appointments", json={
+                    "doctor_id": doctor_id, "patient_name": "Bench", "datetime": dt_string,
+                    "phone_number": f"555-bench-{n}"
+                })
+                client.delete(f"/appointments/{r.json()['appointment_id']}")
+
+            get("/appointments")  # warm-up
+            results = {
+                "full list": [timed(lambda: get("/appointments")) for _ in range(repeats)],
+                "page": [timed(lambda: get("/appointments?limit=1000")) for _ in range(repeats)],
+                "doctors": [timed(lambda: get("/doctors")) for _ in range(repeats)],
+            }
+            after_write = []
+            for n in range(repeats):
+                write(n)
+                after_write.append(timed(lambda: get("/appointments")))
+            results["after a write"] = after_write
+            client.close()
+        finally:
+            stop(process)
+    return results
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1].split(",")] if len(sys.argv) > 1 else SIZES
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else REPEATS
+    print(f"{'rows':>8} | {'request':<14} | {'p50 ms':>9} | {'p95 ms':>9}")
+    for rows in sizes:
+        for name, latencies in measure(rows, repeats).items():
+            cuts = statistics.quantiles(latencies, n=20, method='inclusive')
+            print(f"{rows:>8,} | {name:<14} | {statistics.median(latencies):>9.1f} | {cuts[18]:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
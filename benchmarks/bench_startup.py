@@ -0,0 +1,66 @@
+# file: benchmarks/bench_startup.py
+#
+# Time from launching the API to its first answered request, with years of
+# past appointments on disk. Run from the repository root:
+#
+#     python -m benchmarks.bench_startup [appointments] [upcoming]
+#
+# Each case starts `uvicorn api:app` in a fresh process and polls GET /
+# until it answers:
+#   eager        the whole appointments.json is loaded (the default)
+#   lazy, first  SCHEDULER_LAZY_HISTORY=1 on unsplit data; includes the
+#                one-off split into data/history/ partitions
+#   lazy         SCHEDULER_LAZY_HISTORY=1 again, history already split
+# It also times the first history request the lazy API answers (one month).
+
+import json
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from benchmarks.common import get, make_dataset, start_api, stop
+
+APPOINTMENTS = 500_000
+UPCOMING = 2_000
+
+
+def timed_start(workdir, lazy):
+    """start_api() plus the seconds from launch to the first response."""
+    started = time.perf_counter()
+    process, base_url = start_api(workdir, SCHEDULER_LAZY_HISTORY="1" if lazy else "0")
+    return process, base_url, time.perf_counter() - started
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else APPOINTMENTS
+    upcoming = int(sys.argv[2]) if len(sys.argv) > 2 else UPCOMING
+
+    with tempfile.TemporaryDirectory() as workdir:
+        first, _ = make_dataset(Path(workdir) / "data", count, past=count - upcoming)
+
+        results = {}
+        process, _, results["eager"] = timed_start(workdir, lazy=False)
+        stop(process)
+
+        process, _, results["lazy, first"] = timed_start(workdir, lazy=True)
+        stop(process)
+
+        process, base_url, results["lazy"] = timed_start(workdir, lazy=True)
+        month_start = first + timedelta(days=60)
+        query = f"/appointments?start={month_start.isoformat(timespec='minutes')}" \
+                f"&end={(month_start + timedelta(days=30)).isoformat(timespec='minutes')}"
+        t = time.perf_counter()
+        rows = len(json.loads(get(base_url + query)))
+        history_ms = (time.perf_counter() - t) * 1000
+        stop(process)
+
+    print(f"{count:,} appointments ({upcoming:,} upcoming), seconds to first response")
+    for name, seconds in results.items():
+        print(f"{name:>12} | {seconds:>8.2f}")
+    print(f"first history request (one month, {rows:,} rows): {history_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
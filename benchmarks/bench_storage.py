@@ -0,0 +1,80 @@
+# file: benchmarks/bench_storage.py
+#
+# Compares the JSON and SQLite storage backends on the same synthetic data.
+# Run from the repository root:
+#
+#     python -m benchmarks.bench_storage [count]
+#
+# The SQLite database is built with the same bulk import the API uses on
+# first start, then each backend answers the scheduler's hot-path queries.
+
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.common import DOCTORS, make_dataset
+from core.scheduler import AppointmentScheduler
+from core.storage import to_timestamp
+
+COUNT = 100_000
+CALLS = 200
+WRITES = 20
+
+
+def timed(fn, calls):
+    """Average milliseconds per call of fn(*args) over `calls`."""
+    started = time.perf_counter()
+    for args in calls:
+        fn(*args)
+    return (time.perf_counter() - started) / len(calls) * 1000
+
+
+def run(mode, folder, start, end, rng):
+    started = time.perf_counter()
+    scheduler = AppointmentScheduler(data_folder=folder, storage_mode=mode)
+    load = (time.perf_counter() - started) * 1000
+    storage = scheduler.storage
+    span = int((end - start).total_seconds() // 60)
+    now = datetime.now()
+
+    conflict_probes = [
+        (rng.randint(1, DOCTORS), to_timestamp(start + timedelta(minutes=rng.randrange(span))))
+        for _ in range(CALLS)
+    ]
+    phone_probes = [(f"555-{rng.randrange(COUNT):07d}", now) for _ in range(CALLS)]
+    bookings = [
+        (1, "Bench Patient", (end + timedelta(hours=i)).isoformat(timespec='minutes'), f"999-{i:07d}")
+        for i in range(WRITES)
+    ]
+
+    results = {
+        "startup": load,
+        "conflict check": timed(scheduler._is_conflict, conflict_probes),
+        "phone limit": timed(storage.count_upcoming_for_phone, phone_probes),
+        "add": timed(scheduler.add_appointment, bookings),
+        "upcoming list": timed(scheduler.get_upcoming_appointments, [()] * 3),
+    }
+    cancels = [(appt.appointment_id,) for appt in scheduler.get_upcoming_appointments()[-WRITES:]]
+    results["cancel"] = timed(scheduler.cancel_appointment, cancels)
+    scheduler.close()
+    return results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else COUNT
+    with tempfile.TemporaryDirectory() as folder:
+        start, end = make_dataset(folder, count)
+        json_results = run('json', folder, start, end, random.Random(7))
+        sqlite_results = run('sqlite', folder, start, end, random.Random(7))
+
+    print(f"{count:,} appointments, milliseconds per call")
+    print(f"{'operation':>15} | {'json':>10} | {'sqlite':>10}")
+    print("-" * 41)
+    for name in json_results:
+        print(f"{name:>15} | {json_results[name]:>10.3f} | {sqlite_results[name]:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# file: benchmarks/common.py
+#
+# Helpers shared by the benchmark scripts: one synthetic dataset generator
+# and one way to run api.py under uvicorn in its own process.
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timedelta
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DOCTORS = 4
+SPECIALTIES = ("Cardiologist", "Dermatologist", "Pediatrician", "Neurologist", "General")
+
+
+# --- Data ---
+def make_dataset(folder, count, doctors=DOCTORS, past=0):
+    """
+    Writes doctors.json and appointments.json to `folder`: `count`
+    appointments, 30 minutes apart per doctor. The first `past` of them fill
+    the time just before now; the rest run from tomorrow 00:00. Returns
+    (first slot, first free slot after the data).
+    """
+    now = datetime.now().replace(second=0, microsecond=0)
+    past_rows = -(-past // doctors)  # slots per doctor, rounded up
+    past_start = now - timedelta(minutes=30 * past_rows)
+    start = (now + timedelta(days=1)).replace(hour=0, minute=0)
+    appointments = []
+    for n in range(count):
+        if n < past:
+            slot = past_start + timedelta(minutes=30 * (n // doctors))
+        else:
+            slot = start + timedelta(minutes=30 * ((n - past) // doctors))
+        appointments.append({
+            "appointment_id": f"bench-{n:08d}",
+            "doctor_id": n % doctors + 1,
+            "patient_name": f"Patient {n}",
+            "datetime": slot.isoformat(timespec='minutes'),
+            "phone_number": f"555-{n:07d}",
+            "status": "scheduled"
+        })
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    with open(folder / 'doctors.json', 'w') as f:
+        json.dump([
+            {"doctor_id": i, "name": f"Dr. Bench {i}", "specialty": SPECIALTIES[i % len(SPECIALTIES)]}
+            for i in range(1, doctors + 1)
+        ], f)
+    with open(folder / 'appointments.json', 'w') as f:
+        json.dump(appointments, f)
+    first = past_start if past else start
+    return first, start + timedelta(minutes=30 * -(-(count - past) // doctors))
+
+
+def free_slots(after, doctors, count, offset=0):
+    """`count` (doctor_id, ISO datetime) pairs that never conflict with each other."""
+    return [
+        (n % doctors + 1, (after + timedelta(days=1, minutes=30 * (n // doctors))).isoformat(timespec='minutes'))
+        for n in range(offset, offset + count)
+    ]
+
+
+# --- API process ---
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(url):
+    with urllib.request.urlopen(url) as r:
+        return r.read()
+
+
+def start_api(workdir, workers=1, **env):
+    """
+    Launches `uvicorn api:app` in its own process from `workdir` (the API
+    loads ./data), with `env` added to its environment. Returns
+    (process, base_url) once it answers.
+    """
+    port = free_port()
+    command = [sys.executable, "-m", "uvicorn", "api:app", "--port", str(port), "--log-level", "warning"]
+    if workers > 1:
+        command += ["--workers", str(workers)]
+    process = subprocess.Popen(command, cwd=workdir, env=dict(os.environ, PYTHONPATH=str(REPO_ROOT), **env))
+    base_url = f"http://127.0.0.1:{port}"
+    while True:
+        try:
+            get(base_url + "/")
+            return process, base_url
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("API process exited during startup")
+            time.sleep(0.01)
+
+
+def stop(process):
+    process.terminate()
+    process.wait()
@@ -0,0 +1,126 @@
+# file: benchmarks/stress_concurrency.py
+#
+# Concurrency stress test for a single shared AppointmentScheduler, the way
+# api.py uses it from FastAPI's threadpool. Run from the repository root:
+#
+#     python -m benchmarks.stress_concurrency [bookings] [threads]
+#
+# Thousands of bookings are fired in parallel at a small window of time so
+# most of them collide, with some cancellations mixed in. Afterwards it
+# checks, for every storage mode, that:
+#   * no doctor has two appointments less than 30 minutes apart,
+#   * no phone number holds more than 2 upcoming appointments,
+#   * every successful booking (minus cancellations) is in memory and on
+#     disk after reopening the data folder (no lost writes).
+# Exits with status 1 if any check fails.
+
+import json
+import random
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from core.scheduler import AppointmentScheduler
+from core.storage import STORAGE_MODES
+
+BOOKINGS = 3000
+THREADS = 32
+DOCTORS = 4
+
+
+def write_doctors(folder):
+    doctors = [
+        {"doctor_id": i, "name": f"Dr. Stress {i}", "specialty": "General"}
+        for i in range(1, DOCTORS + 1)
+    ]
+    with open(Path(folder) / 'doctors.json', 'w') as f:
+        json.dump(doctors, f)
+
+
+def make_requests(count, rng):
+    """Bookings on a 10-minute grid over two days, so many of them collide."""
+    base = (datetime.now() + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
+    requests = []
+    for n in range(count):
+        slot = base + timedelta(minutes=10 * rng.randrange(2 * 24 * 6))
+        requests.append((
+            rng.randint(1, DOCTORS),
+            f"Patient {n}",
+            slot.isoformat(timespec='minutes'),
+            f"555-{rng.randrange(count // 2):06d}",
+        ))
+    return requests
+
+
+def find_violations(appointments):
+    problems = []
+    by_doctor = {}
+    by_phone = {}
+    for appt in appointments:
+        dt = datetime.fromisoformat(appt.datetime)
+        by_doctor.setdefault(appt.doctor_id, []).append(dt)
+        by_phone[appt.phone_number] = by_phone.get(appt.phone_number, 0) + 1
+
+    for doctor_id, times in by_doctor.items():
+        times.sort()
+        for earlier, later in zip(times, times[1:]):
+            if later - earlier < timedelta(minutes=30):
+                problems.append(f"doctor {doctor_id} double-booked at {earlier} and {later}")
+    for phone, count in by_phone.items():
+        if count > 2:
+            problems.append(f"phone {phone} has {count} upcoming appointments")
+    return problems
+
+
+def run(mode, bookings, threads):
+    rng = random.Random(mode)
+    with tempfile.TemporaryDirectory() as folder:
+        write_doctors(folder)
+        scheduler = AppointmentScheduler(data_folder=folder, storage_mode=mode)
+        booked = set()
+        cancelled = set()
+
+        def book(request):
+            success, _, appt = scheduler.add_appointment(*request)
+            if success:
+                booked.add(appt.appointment_id)
+                # Cancel roughly one in ten, racing with other bookings
+                if rng.random() < 0.1:
+                    if scheduler.cancel_appointment(appt.appointment_id)[0]:
+                        cancelled.add(appt.appointment_id)
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(book, make_requests(bookings, rng)))
+
+        expected = booked - cancelled
+        in_memory = scheduler.get_all_appointments()
+        scheduler.close()
+        on_disk = AppointmentScheduler(data_folder=folder, storage_mode=mode).get_all_appointments()
+
+        problems = find_violations(in_memory)
+        for label, appointments in (("memory", in_memory), ("disk", on_disk)):
+            ids = {appt.appointment_id for appt in appointments}
+            if ids != expected:
+                problems.append(
+                    f"{label}: {len(expected - ids)} lost and {len(ids - expected)} unexpected appointments"
+                )
+
+    status = "OK" if not problems else "FAILED"
+    print(f"{mode:>8}: {len(booked):>5} booked, {len(cancelled):>4} cancelled, {len(expected):>5} kept ... {status}")
+    for problem in problems[:10]:
+        print(f"          {problem}")
+    return not problems
+
+
+def main():
+    bookings = int(sys.argv[1]) if len(sys.argv) > 1 else BOOKINGS
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else THREADS
+    print(f"{bookings} parallel bookings on {threads} threads")
+    results = [run(mode, bookings, threads) for mode in STORAGE_MODES]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
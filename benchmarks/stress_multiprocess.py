@@ -0,0 +1,257 @@
+# file: benchmarks/stress_multiprocess.py
+#
+# Stress test for several processes sharing one SQLite store, the way
+# `uvicorn api:app --workers N` runs with SCHEDULER_STORAGE=sqlite. Run from
+# the repository root:
+#
+#     python -m benchmarks.stress_multiprocess [bookings] [processes]
+#
+# Two rounds fire colliding bookings (with cancellations and reschedules
+# mixed in) at one data folder:
+#   scheduler  `processes` separate Python processes, each with its own
+#              AppointmentScheduler on the same database
+#   api        uvicorn with `processes` workers, driven over HTTP by
+#              concurrent clients
+# Afterwards it checks that:
+#   * no doctor has two appointments less than 30 minutes apart and no
+#     phone number holds more than 2 upcoming appointments (no double
+#     bookings across processes),
+#   * every successful booking, minus cancellations, is stored at the time
+#     of its last successful reschedule (no lost writes),
+#   * the data version counts every successful write, and every process
+#     (worker) reports that same version,
+#   * a change token from one process replays on another straight away,
+#     without waiting for its poll of the shared change log.
+# Exits with status 1 if any check fails.
+
+import multiprocessing
+import random
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import start_api, stop
+from benchmarks.stress_concurrency import find_violations, make_requests, write_doctors
+from core.scheduler import AppointmentScheduler
+
+BOOKINGS = 2000
+PROCESSES = 4
+CLIENT_THREADS = 16
+# Share of successful bookings that are then cancelled / moved
+CANCEL_SHARE = 0.1
+RESCHEDULE_SHARE = 0.2
+# Writes whose change token is then replayed on another process
+REPLAYS = 50
+
+
+def random_slot(rng):
+    """A slot on the same colliding grid as make_requests()."""
+    base = (datetime.now() + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
+    return (base + timedelta(minutes=10 * rng.randrange(2 * 24 * 6))).isoformat(timespec='minutes')
+
+
+def replay_slot(n):
+    """A slot well clear of the make_requests() grid."""
+    base = (datetime.now() + timedelta(days=10)).replace(hour=8, minute=0, second=0, microsecond=0)
+    return (base + timedelta(minutes=30 * n)).isoformat(timespec='minutes')
+
+
+class Outcome:
+    """What one client saw succeed: bookings, cancellations and final times."""
+    def __init__(self):
+        self.booked = set()
+        self.cancelled = set()
+        self.times = {}
+        self.writes = 0
+
+    def merge(self, other):
+        self.booked |= other.booked
+        self.cancelled |= other.cancelled
+        self.times.update(other.times)
+        self.writes += other.writes
+
+
+def exercise(book, reschedule, cancel, request, rng, outcome):
+    """Books `request`, then maybe moves and/or cancels it, recording every success."""
+    appointment_id, dt_string = book(request)
+    if appointment_id is None:
+        return
+    outcome.booked.add(appointment_id)
+    outcome.times[appointment_id] = dt_string
+    outcome.writes += 1
+    if rng.random() < RESCHEDULE_SHARE:
+        new_time = random_slot(rng)
+        if reschedule(appointment_id, new_time):
+            outcome.times[appointment_id] = new_time
+            outcome.writes += 1
+    if rng.random() < CANCEL_SHARE and cancel(appointment_id):
+        outcome.cancelled.add(appointment_id)
+        outcome.writes += 1
+
+
+# --- Round 1: schedulers in separate processes ---
+def scheduler_worker(folder, requests, seed):
+    rng = random.Random(seed)
+    scheduler = AppointmentScheduler(data_folder=folder, storage_mode='sqlite')
+    outcome = Outcome()
+
+    def book(request):
+        success, _, appt = scheduler.add_appointment(*request)
+        return (appt.appointment_id, appt.datetime) if success else (None, None)
+
+    for request in requests:
+        exercise(
+            book,
+            lambda appointment_id, dt_string: scheduler.reschedule_appointment(appointment_id, dt_string)[0],
+            lambda appointment_id: scheduler.cancel_appointment(appointment_id)[0],
+            request, rng, outcome
+        )
+    scheduler.close()
+    return outcome
+
+
+def run_schedulers(folder, requests, processes):
+    chunks = [requests[i::processes] for i in range(processes)]
+    # spawn: every worker starts clean, like a separate server process
+    with multiprocessing.get_context('spawn').Pool(processes) as pool:
+        outcomes = pool.starmap(scheduler_worker, [(folder, chunk, n) for n, chunk in enumerate(chunks)])
+    scheduler = AppointmentScheduler(data_folder=folder, storage_mode='sqlite')
+    try:
+        stored = {appt.appointment_id: appt.datetime for appt in scheduler.get_all_appointments()}
+        versions = {scheduler.data_version}
+        violations = find_violations(scheduler.get_all_appointments())
+    finally:
+        scheduler.close()
+    return outcomes, stored, violations, versions, replay_schedulers(folder)
+
+
+def replay_schedulers(folder):
+    """Books and cancels on one scheduler; returns how often another couldn't replay the token."""
+    writer = AppointmentScheduler(data_folder=folder, storage_mode='sqlite')
+    reader = AppointmentScheduler(data_folder=folder, storage_mode='sqlite')
+    failures = 0
+    try:
+        for n in range(REPLAYS):
+            success, _, appt = writer.add_appointment(1, "Replay", replay_slot(n), "555-replay")
+            if success:
+                failures += reader.changes_since(writer.change_token) is None
+                writer.cancel_appointment(appt.appointment_id)
+    finally:
+        writer.close()
+        reader.close()
+    return failures
+
+
+# --- Round 2: uvicorn workers ---
+class _Appointment:
+    """Just the fields find_violations() reads, from an API response."""
+    def __init__(self, data):
+        self.appointment_id = data["appointment_id"]
+        self.doctor_id = data["doctor_id"]
+        self.datetime = data["datetime"]
+        self.phone_number = data["phone_number"]
+
+
+def run_api(workdir, requests, processes):
+    process, base_url = start_api(workdir, workers=processes, SCHEDULER_STORAGE='sqlite')
+    try:
+        # No keep-alive: every request gets a new connection, and so is
+        # spread over the workers
+        client = httpx.Client(base_url=base_url, timeout=60, limits=httpx.Limits(max_keepalive_connections=0))
+
+        def book(request):
+            doctor_id, patient_name, dt_string, phone_number = request
+            r = client.post("/appointments", json={
+                "doctor_id": doctor_id, "patient_name": patient_name,
+                "datetime": dt_string, "phone_number": phone_number
+            })
+            return (r.json()["appointment_id"], r.json()["datetime"]) if r.status_code == 201 else (None, None)
+
+        def reschedule(appointment_id, dt_string):
+            return client.patch(f"/appointments/{appointment_id}", json={"datetime": dt_string}).status_code == 200
+
+        def cancel(appointment_id):
+            return client.delete(f"/appointments/{appointment_id}").status_code == 200
+
+        def run_client(args):
+            n, chunk = args
+            rng, outcome = random.Random(n), Outcome()
+            for request in chunk:
+                exercise(book, reschedule, cancel, request, rng, outcome)
+            return outcome
+
+        chunks = [requests[i::CLIENT_THREADS] for i in range(CLIENT_THREADS)]
+        with ThreadPoolExecutor(CLIENT_THREADS) as pool:
+            outcomes = list(pool.map(run_client, enumerate(chunks)))
+
+        appointments = [_Appointment(appt) for appt in client.get("/appointments").json()]
+        stored = {appt.appointment_id: appt.datetime for appt in appointments}
+        # Ask often enough that every worker answers at least once
+        versions = {client.get("/version").json()["version"] for _ in range(10 * processes)}
+
+        # Writes and reads land on different workers, as connections aren't reused
+        failures = 0
+        for n in range(REPLAYS):
+            r = client.post("/appointments", json={
+                "doctor_id": 1, "patient_name": "Replay", "datetime": replay_slot(n), "phone_number": "555-replay"
+            })
+            if r.status_code == 201:
+                token = client.get("/appointments", params={"limit": 1}).headers["ETag"].strip('"')
+                failures += client.get("/changes", params={"since": token}).status_code != 200
+                client.delete(f"/appointments/{r.json()['appointment_id']}")
+        client.close()
+        return outcomes, stored, find_violations(appointments), versions, failures
+    finally:
+        stop(process)
+
+
+def check(label, outcomes, stored, violations, versions, replay_failures):
+    total = Outcome()
+    for outcome in outcomes:
+        total.merge(outcome)
+    problems = list(violations)
+    expected = {appointment_id: total.times[appointment_id] for appointment_id in total.booked - total.cancelled}
+    lost = expected.keys() - stored.keys()
+    unexpected = stored.keys() - expected.keys()
+    if lost or unexpected:
+        problems.append(f"{len(lost)} lost and {len(unexpected)} unexpected appointments")
+    moved_wrong = [i for i in expected.keys() & stored.keys() if stored[i] != expected[i]]
+    if moved_wrong:
+        problems.append(f"{len(moved_wrong)} appointments not at their last rescheduled time")
+    if versions != {total.writes}:
+        problems.append(f"data versions {sorted(versions)}, expected {total.writes} (one per write)")
+    if replay_failures:
+        problems.append(f"{replay_failures} of {REPLAYS} change tokens couldn't be replayed on another process")
+
+    status = "OK" if not problems else "FAILED"
+    print(f"{label:>9}: {len(total.booked):>5} booked, {len(total.cancelled):>4} cancelled, "
+          f"{total.writes:>5} writes, {len(expected):>5} kept ... {status}")
+    for problem in problems[:10]:
+        print(f"           {problem}")
+    return not problems
+
+
+def main():
+    bookings = int(sys.argv[1]) if len(sys.argv) > 1 else BOOKINGS
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else PROCESSES
+    print(f"{bookings} colliding bookings from {processes} processes sharing one SQLite store")
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        write_doctors(folder)
+        requests = make_requests(bookings, random.Random("scheduler"))
+        results.append(check("scheduler", *run_schedulers(folder, requests, processes)))
+    with tempfile.TemporaryDirectory() as workdir:
+        data = Path(workdir) / "data"
+        data.mkdir()
+        write_doctors(data)
+        requests = make_requests(bookings, random.Random("api"))
+        results.append(check("api", *run_api(workdir, requests, processes)))
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+# file: benchmarks/suite.py
+#
+# Reproducible benchmark suite for regression tracking. Run from the
+# repository root:
+#
+#     python -m benchmarks.suite [--appointments N] [--doctors N] [--storage json,sqlite]
+#                                [--ops N] [--requests N] [--concurrency N] [--mcp-calls N]
+#                                [--out report.json] [--compare old.json] [--threshold 0.15]
+#
+# On one synthetic dataset it measures:
+#   scheduler.*  AppointmentScheduler in-process: add, cancel, conflict check
+#                and an upcoming-appointments page, per storage mode
+#   api.*        api.py served by uvicorn in its own process, each endpoint
+#                driven by --concurrency client threads (latency percentiles
+#                and requests/s)
+#   mcp.*        MCP tool calls from server/main.py, over HTTP to that API
+#                (read cache TTLs set to 0, so every call reaches the API)
+#                and with the in-process transport
+#
+# Everything lands in one JSON report (default benchmarks/results/<commit>.json)
+# together with the commit, machine and parameters. --compare prints the
+# change against an older report and exits with status 1 if any p50 latency
+# got slower by more than --threshold.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import REPO_ROOT, free_slots, make_dataset, start_api, stop
+from core.records import to_timestamp
+from core.scheduler import AppointmentScheduler
+
+RESULTS_DIR = REPO_ROOT / "benchmarks" / "results"
+# Share of the synthetic appointments that lie in the past
+PAST_SHARE = 0.2
+SEED = 42
+
+
+# --- Measurement ---
+def summarize(latencies, wall):
+    """Latency percentiles (ms) and throughput for one measured operation."""
+    ms = sorted(latency * 1000 for latency in latencies)
+    cuts = statistics.quantiles(ms, n=100, method='inclusive') if len(ms) > 1 else ms * 99
+    return {
+        "count": len(ms),
+        "ops_per_s": round(len(ms) / wall, 1) if wall else None,
+        "mean_ms": round(statistics.fmean(ms), 6),
+        "p50_ms": round(cuts[49], 6),
+        "p95_ms": round(cuts[94], 6),
+        "p99_ms": round(cuts[98], 6),
+        "max_ms": round(ms[-1], 6),
+    }
+
+
+def run_serial(fn, calls):
+    latencies = []
+    started = time.perf_counter()
+    for args in calls:
+        t = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def run_concurrent(fn, calls, concurrency):
+    def timed(args):
+        t = time.perf_counter()
+        fn(*args)
+        return time.perf_counter() - t
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(timed, calls))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+# --- Sections ---
+def bench_scheduler(folder, mode, args, free_after):
+    rng = random.Random(SEED)
+    scheduler = AppointmentScheduler(data_folder=folder, storage_mode=mode)
+    try:
+        now = datetime.now()
+        results = {}
+        bookings = [
+            (doctor_id, "Suite Patient", dt, f"777-{n:07d}")
+            for n, (doctor_id, dt) in enumerate(free_slots(free_after, args.doctors, args.ops))
+        ]
+        booked = []
+
+        def add(*booking):
+            success, message, appt = scheduler.add_appointment(*booking)
+            if not success:
+                raise RuntimeError(message)
+            booked.append(appt.appointment_id)
+
+        results["add"] = run_serial(add, bookings)
+        results["cancel"] = run_serial(scheduler.cancel_appointment, [(i,) for i in booked])
+
+        span = int((free_after - now).total_seconds() // 60)
+        probes = [
+            (rng.randint(1, args.doctors), to_timestamp(now + timedelta(minutes=rng.randrange(span))))
+            for _ in range(args.ops * 10)
+        ]
+        results["conflict_check"] = run_serial(scheduler._is_conflict, probes)
+
+        start = now.isoformat(timespec='minutes')
+        pages = [(rng.randint(1, args.doctors),) for _ in range(args.ops)]
+        results["upcoming_page"] = run_serial(
+            lambda doctor_id: scheduler.query_appointments(doctor_id=doctor_id, start=start, limit=50), pages
+        )
+        return results
+    finally:
+        scheduler.close()
+
+
+def bench_api(base_url, args, free_after):
+    rng = random.Random(SEED)
+    client = httpx.Client(
+        base_url=base_url, timeout=30,
+        limits=httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    )
+
+    def request(method, path, **kwargs):
+        r = client.request(method, path, **kwargs)
+        if r.is_error:
+            raise RuntimeError(f"{method} {path}: {r.status_code} {r.text[:200]}")
+        return r
+
+    try:
+        results = {}
+        start = datetime.now().isoformat(timespec='minutes')
+        n = args.requests
+        doctors = [(rng.randint(1, args.doctors),) for _ in range(n)]
+
+        results["GET /appointments page"] = run_concurrent(
+            lambda d: request("GET", "/appointments", params={"doctor_id": d, "start": start, "limit": 50}),
+            doctors, args.concurrency
+        )
+        results["GET /stats"] = run_concurrent(lambda: request("GET", "/stats"), [()] * n, args.concurrency)
+        results["GET /doctors/{id}/availability"] = run_concurrent(
+            lambda d: request("GET", f"/doctors/{d}/availability"), doctors, args.concurrency
+        )
+
+        booked = []
+        bookings = [
+            ({"doctor_id": d, "patient_name": "Suite Patient", "datetime": dt, "phone_number": f"888-{i:07d}"},)
+            for i, (d, dt) in enumerate(free_slots(free_after, args.doctors, n, offset=args.ops))
+        ]
+        results["POST /appointments"] = run_concurrent(
+            lambda body: booked.append(request("POST", "/appointments", json=body).json()["appointment_id"]),
+            bookings, args.concurrency
+        )
+        results["DELETE /appointments/{id}"] = run_concurrent(
+            lambda i: request("DELETE", f"/appointments/{i}"), [(i,) for i in booked], args.concurrency
+        )
+        return results
+    finally:
+        client.close()
+
+
+async def mcp_tool_calls(mcp_server, args, free_after, offset):
+    def timed(fn, calls):
+        async def run():
+            latencies = []
+            started = time.perf_counter()
+            for call in calls:
+                t = time.perf_counter()
+                await fn(*call)
+                latencies.append(time.perf_counter() - t)
+            return summarize(latencies, time.perf_counter() - started)
+        return run()
+
+    async def book_and_cancel(doctor_id, dt, phone):
+        text = await mcp_server.add_appointment(doctor_id, "Suite Patient", phone, dt)
+        appointment_id = text.split("'appointment_id': '")[1].split("'")[0]
+        await mcp_server.cancel_appointment(appointment_id)
+
+    calls = args.mcp_calls
+    doctors = [(d % args.doctors + 1,) for d in range(calls)]
+    bookings = [
+        (d, dt, f"999-{offset + i:07d}")
+        for i, (d, dt) in enumerate(free_slots(free_after, args.doctors, calls, offset=offset))
+    ]
+    try:
+        return {
+            "fetch_doctors": await timed(mcp_server.fetch_doctors, [()] * calls),
+            "fetch_appointments(doctor)": await timed(mcp_server.fetch_appointments, doctors),
+            "find_available_slots(doctor)": await timed(
+                lambda d: mcp_server.find_available_slots(doctor_id=d), doctors
+            ),
+            "add + cancel": await timed(book_and_cancel, bookings),
+        }
+    finally:
+        await mcp_server.close_client()
+        mcp_server.close_transport()
+
+
+def bench_mcp(base_url, folder, mode, args, free_after):
+    os.environ["API_BASE_URL"] = base_url
+    from server import main as mcp_server
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    mcp_server.API_BASE_URL = base_url
+    # No TTL: every timed read reaches the API instead of the MCP read cache
+    mcp_server.DOCTORS_CACHE_TTL = mcp_server.APPOINTMENTS_CACHE_TTL = 0
+    mcp_server.MCP_TRANSPORT = "http"
+    http = asyncio.run(mcp_tool_calls(mcp_server, args, free_after, offset=args.ops + args.requests))
+
+    mcp_server.MCP_TRANSPORT = "inprocess"
+    mcp_server.SCHEDULER_DATA_FOLDER = str(folder)
+    mcp_server.SCHEDULER_STORAGE = mode
+    local = asyncio.run(mcp_tool_calls(mcp_server, args, free_after, offset=args.ops + args.requests))
+    return {"http": http, "inprocess": local}
+
+
+# --- Report ---
+def git_commit():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def compare(report, baseline, threshold):
+    """Prints p50 changes against `baseline`; returns the names that regressed."""
+    old, new = baseline["results"], report["results"]
+    regressions = []
+    print(f"\ncompared with {baseline['meta'].get('commit') or 'baseline'} (p50 ms)")
+    print(f"{'benchmark':>58} | {'before':>9} | {'after':>9} | {'change':>7}")
+    print("-" * 93)
+    for name in sorted(set(old) & set(new)):
+        before, after = old[name]["p50_ms"], new[name]["p50_ms"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  <- slower"
+        print(f"{name:>58} | {before:>9.3f} | {after:>9.3f} | {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scheduler, API and MCP benchmarks with a JSON report.")
+    parser.add_argument("--appointments", type=int, default=10_000)
+    parser.add_argument("--doctors", type=int, default=20)
+    parser.add_argument("--storage", default="json", help="Comma-separated storage modes, e.g. json,journal,sqlite")
+    parser.add_argument("--ops", type=int, default=300, help="Operations per in-process benchmark")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per API endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent API clients")
+    parser.add_argument("--mcp-calls", type=int, default=100, help="Calls per MCP tool; 0 skips MCP")
+    parser.add_argument("--out", help="Report file (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Earlier report to compare with")
+    parser.add_argument("--threshold", type=float, default=0.15, help="p50 slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    commit, dirty = git_commit()
+    results = {}
+    for mode in args.storage.split(","):
+        with tempfile.TemporaryDirectory() as workdir:
+            data = Path(workdir) / "data"
+            _, free_after = make_dataset(
+                data, args.appointments, args.doctors, past=int(args.appointments * PAST_SHARE)
+            )
+            local = Path(workdir) / "local"
+            shutil.copytree(data, local)
+
+            print(f"[{mode}] scheduler ...", flush=True)
+            for name, result in bench_scheduler(local, mode, args, free_after).items():
+                results[f"scheduler.{mode}.{name}"] = result
+
+            print(f"[{mode}] api ...", flush=True)
+            process, base_url = start_api(workdir, SCHEDULER_STORAGE=mode)
+            try:
+                for name, result in bench_api(base_url, args, free_after).items():
+                    results[f"api.{mode}.{name}"] = result
+                if args.mcp_calls:
+                    print(f"[{mode}] mcp ...", flush=True)
+                    for transport, tools in bench_mcp(base_url, local, mode, args, free_after).items():
+                        for name, result in tools.items():
+                            results[f"mcp.{mode}.{transport}.{name}"] = result
+            finally:
+                stop(process)
+
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "date": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "params": vars(args),
+        },
+        "results": results,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{(commit or 'unknown')[:12]}{'-dirty' if dirty else ''}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{args.appointments:,} appointments, {args.doctors} doctors")
+    print(f"{'benchmark':>58} | {'ops/s':>9} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8}")
+    print("-" * 103)
+    for name, r in results.items():
+        print(f"{name:>58} | {r['ops_per_s']:>9,.0f} | {r['p50_ms']:>8.3f} | {r['p95_ms']:>8.3f} | {r['p99_ms']:>8.3f}")
+    print(f"\nreport written to {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than the {args.threshold:.0%} threshold")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# file: core/events.py
+
+import threading
+from collections import deque
+
+
+class ChangeFeed:
+    """
+    The most recent change events, for clients that follow changes instead
+    of re-reading every appointment.
+
+    Each event is a dict whose `seq` is the scheduler's data version after
+    the change, so sequence numbers only grow (with gaps where a version
+    bump changed nothing). At most `size` events are kept; a client that
+    falls further behind has to reload. Listeners are called with no
+    arguments after every publish and on close(), from the calling thread.
+    """
+    def __init__(self, size=1000):
+        self._events = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._listeners = set()
+        self.seq = 0
+        # Newest seq that has been pushed out of the buffer
+        self._dropped_seq = 0
+        self.closed = False
+
+    def publish(self, seq, event=None):
+        """Moves the feed to `seq`, buffering `event` (if any) under it."""
+        with self._lock:
+            self.seq = seq
+            if event is not None:
+                if len(self._events) == self._events.maxlen:
+                    self._dropped_seq = self._events[0]['seq']
+                self._events.append(dict(event, seq=seq))
+            listeners = list(self._listeners)
+        self._notify(listeners)
+
+    def reset(self, seq):
+        """
+        Drops the buffered events and continues at `seq`; followers that are
+        further behind have to reload.
+        """
+        with self._lock:
+            self._events.clear()
+            self.seq = self._dropped_seq = seq
+
+    def close(self):
+        """Tells followers to stop; the buffered events stay readable."""
+        with self._lock:
+            self.closed = True
+            listeners = list(self._listeners)
+        self._notify(listeners)
+
+    def _notify(self, listeners):
+        for listener in listeners:
+            listener()
+
+    def since(self, seq):
+        """
+        Returns (events after `seq`, current seq), or None if some of those
+        events are no longer buffered or `seq` is ahead of the feed.
+        """
+        with self._lock:
+            if seq < self._dropped_seq or seq > self.seq:
+                return None
+            return [event for event in self._events if event['seq'] > seq], self.seq
+
+    def subscribe(self, listener):
+        with self._lock:
+            self._listeners.add(listener)
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            self._listeners.discard(listener)
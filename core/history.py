@@ -0,0 +1,173 @@
+# file: core/history.py
+
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from core.journal import write_json_atomic
+from core.records import Appointment, format_timestamp
+
+
+def month_of(ts):
+    """Partition key ('YYYY-MM') for a timestamp."""
+    return format_timestamp(ts)[:7]
+
+
+def _safe_month(ts):
+    """month_of(ts), or None for no bound (None or an out-of-range sentinel)."""
+    try:
+        return month_of(ts) if ts is not None else None
+    except (OverflowError, ValueError):
+        return None
+
+
+def _sort_key(appt):
+    return appt.ts, appt.appointment_id
+
+
+class HistoryStore:
+    """
+    Past appointments, kept out of memory in month partitions:
+    data/history/YYYY-MM.json, each a JSON list in the same shape as
+    appointments.json, sorted by time.
+
+    manifest.json records the `boundary` timestamp (every appointment in the
+    partitions is before it, everything from it on lives in the hot store)
+    and the number of appointments per month. Partitions are read on first
+    use and the most recent `cache_months` of them are kept in memory.
+    """
+    def __init__(self, folder, cache_months=12):
+        self.folder = Path(folder)
+        self.manifest_file = self.folder / 'manifest.json'
+        self.cache_months = cache_months
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+        self.boundary = None
+        self._counts = {}
+        self._manifest_dirty = False
+        if self.manifest_file.exists():
+            with open(self.manifest_file, 'r') as f:
+                manifest = json.load(f)
+            self.boundary = manifest.get('boundary')
+            self._counts = manifest.get('counts', {})
+
+    @property
+    def initialized(self):
+        return self.boundary is not None
+
+    def months(self):
+        """Sorted partition keys that exist on disk."""
+        return sorted(path.stem for path in self.folder.glob('????-??.json'))
+
+    def _partition_file(self, month):
+        return self.folder / f'{month}.json'
+
+    def count(self):
+        """Number of archived appointments, without reading the partitions."""
+        with self._lock:
+            for month in self.months():
+                if month not in self._counts:
+                    self._counts[month] = len(self.load_month(month))
+                    self._manifest_dirty = True
+            return sum(self._counts.values())
+
+    def load_month(self, month):
+        """The records of one partition, sorted by (ts, appointment_id)."""
+        with self._lock:
+            records = self._cache.get(month)
+            if records is not None:
+                self._cache.move_to_end(month)
+                return records
+            try:
+                with open(self._partition_file(month), 'r') as f:
+                    rows = json.load(f)
+            except (json.JSONDecodeError, FileNotFoundError):
+                rows = []
+            records = sorted((Appointment.from_dict(row) for row in rows), key=_sort_key)
+            self._cache[month] = records
+            while len(self._cache) > self.cache_months:
+                self._cache.popitem(last=False)
+            return records
+
+    # --- Writes ---
+    def add(self, records):
+        """
+        Merges `records` into their month partitions. Ids already in a
+        partition are skipped, so repeating an interrupted add is harmless.
+        Callers move the boundary with set_boundary() once the records are
+        gone from the hot store.
+        """
+        by_month = {}
+        for appt in records:
+            by_month.setdefault(month_of(appt.ts), []).append(appt)
+        with self._lock:
+            self.folder.mkdir(parents=True, exist_ok=True)
+            for month, new_records in by_month.items():
+                existing = self.load_month(month) if self._partition_file(month).exists() else []
+                known = {appt.appointment_id for appt in existing}
+                merged = existing + [appt for appt in new_records if appt.appointment_id not in known]
+                merged.sort(key=_sort_key)
+                write_json_atomic(self._partition_file(month), merged)
+                self._cache.pop(month, None)
+                self._counts[month] = len(merged)
+                self._manifest_dirty = True
+
+    def set_boundary(self, boundary):
+        """Moves the boundary forward and saves the manifest."""
+        with self._lock:
+            if self.boundary is not None and boundary <= self.boundary and not self._manifest_dirty:
+                return
+            if self.boundary is not None:
+                boundary = max(boundary, self.boundary)
+            self.folder.mkdir(parents=True, exist_ok=True)
+            write_json_atomic(self.manifest_file, {"boundary": boundary, "counts": self._counts})
+            self.boundary = boundary
+            self._manifest_dirty = False
+
+    # --- Queries ---
+    def _months_between(self, start_ts, end_ts):
+        months = self.months()
+        first = _safe_month(start_ts)
+        if first is not None:
+            months = [month for month in months if month >= first]
+        last = _safe_month(end_ts)
+        if last is not None:
+            months = [month for month in months if month <= last]
+        return months
+
+    def query(self, doctor_id=None, phone_number=None, status=None,
+              start_ts=None, end_ts=None, after=None, limit=None):
+        """Same contract as JSONStorage.query, loading only the months it reaches."""
+        results = []
+        # Pages resume from the cursor's month instead of the first one
+        lower = start_ts
+        if after is not None:
+            lower = after[0] if start_ts is None else max(start_ts, after[0])
+        for month in self._months_between(lower, end_ts):
+            for appt in self.load_month(month):
+                ts = appt.ts
+                if start_ts is not None and ts < start_ts:
+                    continue
+                if end_ts is not None and ts >= end_ts:
+                    return results
+                if after is not None and (ts, appt.appointment_id) <= tuple(after):
+                    continue
+                if doctor_id is not None and appt.doctor_id != doctor_id:
+                    continue
+                if phone_number is not None and appt.phone_number != phone_number:
+                    continue
+                if status is not None and appt.status != status:
+                    continue
+                results.append((ts, appt))
+                if limit is not None and len(results) >= limit:
+                    return results
+        return results
+
+    def doctor_slots(self, doctor_id, start_ts, end_ts):
+        """Sorted timestamps of the doctor's archived appointments within [start_ts, end_ts]."""
+        return [
+            appt.ts for month in self._months_between(start_ts, end_ts)
+            for appt in self.load_month(month)
+            if appt.doctor_id == doctor_id and start_ts <= appt.ts <= end_ts
+        ]
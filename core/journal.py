@@ -0,0 +1,177 @@
+# file: core/journal.py
+
+import json
+import os
+import threading
+from pathlib import Path
+
+from core import metrics
+
+BYTES_WRITTEN = metrics.counter(
+    'storage_bytes_written_total', 'Bytes written to JSON snapshots and journals.', ['kind']
+)
+
+
+def _to_json(obj):
+    """json `default` hook: records such as core.records.Appointment provide to_dict()."""
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def write_json_atomic(filepath, data):
+    """
+    Writes `data` as indented JSON next to `filepath` and atomically renames it
+    into place, so a crash mid-write never leaves a half-written file behind.
+    """
+    filepath = Path(filepath)
+    tmp_path = filepath.with_name(filepath.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4, default=_to_json)
+        f.flush()
+        os.fsync(f.fileno())
+        BYTES_WRITTEN.inc(f.tell(), kind='json')
+    os.replace(tmp_path, filepath)
+
+
+class AppointmentJournal:
+    """
+    Append-only write-ahead log for appointment mutations.
+
+    Every add/update/cancel is appended to `<snapshot>.wal` as one JSON line. The log
+    is fsync'd in batches (every `batch_size` entries or `fsync_interval`
+    seconds, whichever comes first) and folded back into the JSON snapshot by
+    a background compaction once it grows past `compact_after` entries.
+
+    Replaying is idempotent (re-adding a known id, or updating or cancelling
+    an unknown one, is a no-op), so a crash at any point during compaction is safe.
+    """
+    def __init__(self, snapshot_file, snapshot_provider, batch_size=64,
+                 fsync_interval=0.05, compact_after=10_000):
+        self.snapshot_file = Path(snapshot_file)
+        self.log_file = self.snapshot_file.with_name(self.snapshot_file.name + '.wal')
+        # While a compaction is running the previous log is parked here.
+        self.compacting_file = self.snapshot_file.with_name(self.snapshot_file.name + '.wal.1')
+        self.snapshot_provider = snapshot_provider
+        self.batch_size = batch_size
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+
+        self._lock = threading.Lock()
+        self._log = None
+        self._entries = 0
+        self._unsynced = 0
+        self._compaction = None
+        self._closed = threading.Event()
+        self._flusher = None
+
+    # --- Startup ---
+    def replay(self, appointments):
+        """Applies any logged mutations on top of the loaded snapshot."""
+        by_id = {appt['appointment_id']: appt for appt in appointments}
+        for path in (self.compacting_file, self.log_file):
+            for entry in self._read_entries(path):
+                if entry.get('op') == 'add':
+                    appt = entry['appointment']
+                    by_id.setdefault(appt['appointment_id'], appt)
+                elif entry.get('op') == 'update':
+                    appt = entry['appointment']
+                    if appt['appointment_id'] in by_id:
+                        by_id[appt['appointment_id']] = appt
+                elif entry.get('op') == 'cancel':
+                    by_id.pop(entry['appointment_id'], None)
+                self._entries += 1
+        return list(by_id.values())
+
+    def _read_entries(self, path):
+        if not path.exists():
+            return
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # Only the last line can be torn by a crash; ignore it.
+                    continue
+
+    def open(self):
+        self._log = open(self.log_file, 'a')
+        self._flusher = threading.Thread(target=self._flush_loop, name='appointment-journal', daemon=True)
+        self._flusher.start()
+        if self._entries >= self.compact_after or self.compacting_file.exists():
+            self.compact()
+
+    # --- Writes ---
+    def append_add(self, appointment):
+        self._append({"op": "add", "appointment": appointment})
+
+    def append_update(self, appointment):
+        self._append({"op": "update", "appointment": appointment})
+
+    def append_cancel(self, appointment_id):
+        self._append({"op": "cancel", "appointment_id": appointment_id})
+
+    def _append(self, entry):
+        with self._lock:
+            line = json.dumps(entry, default=_to_json) + '\n'
+            self._log.write(line)
+            self._log.flush()
+            BYTES_WRITTEN.inc(len(line), kind='journal')
+            self._entries += 1
+            self._unsynced += 1
+            if self._unsynced >= self.batch_size:
+                self._sync_locked()
+            needs_compaction = self._entries >= self.compact_after
+        if needs_compaction:
+            self.compact()
+
+    def _sync_locked(self):
+        if self._unsynced:
+            os.fsync(self._log.fileno())
+            self._unsynced = 0
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            with self._lock:
+                if self._log is not None:
+                    self._sync_locked()
+
+    # --- Compaction ---
+    def compact(self, wait=False):
+        """Starts folding the log into the snapshot in a background thread."""
+        with self._lock:
+            if self._compaction is None or not self._compaction.is_alive():
+                if not self.compacting_file.exists():
+                    # Park the current log and start a fresh one; entries that
+                    # arrive during compaction land in the new file.
+                    self._sync_locked()
+                    self._log.close()
+                    os.replace(self.log_file, self.compacting_file)
+                    self._log = open(self.log_file, 'a')
+                    self._entries = 0
+                snapshot = list(self.snapshot_provider())
+                self._compaction = threading.Thread(
+                    target=self._write_snapshot, args=(snapshot,),
+                    name='appointment-compaction', daemon=True
+                )
+                self._compaction.start()
+            compaction = self._compaction
+        if wait:
+            compaction.join()
+
+    def _write_snapshot(self, snapshot):
+        write_json_atomic(self.snapshot_file, snapshot)
+        self.compacting_file.unlink(missing_ok=True)
+
+    def close(self):
+        """Flushes pending entries and waits for a running compaction."""
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        if self._compaction is not None:
+            self._compaction.join()
+        with self._lock:
+            if self._log is not None:
+                self._sync_locked()
+                self._log.close()
+                self._log = None
@@ -0,0 +1,128 @@
+# file: core/records.py
+
+from datetime import datetime, timedelta
+from enum import Enum
+from functools import lru_cache
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_timestamp(dt):
+    """
+    Converts a naive datetime into whole seconds since 1970-01-01.
+    No timezone conversion is applied, so the value orders exactly like the
+    ISO strings stored in appointments.json.
+    """
+    return (dt - _EPOCH) // timedelta(seconds=1)
+
+
+def parse_datetime(dt_string):
+    """
+    Parses an ISO datetime given as local time. Raises ValueError if it is
+    malformed or carries a UTC offset, as stored slots have none to compare
+    against.
+    """
+    dt = datetime.fromisoformat(dt_string)
+    if dt.tzinfo is not None:
+        raise ValueError(f"Datetime must not have a UTC offset: {dt_string}")
+    return dt
+
+
+def parse_timestamp(dt_string):
+    """Returns to_timestamp() of an ISO string, or None if it can't be parsed."""
+    try:
+        return to_timestamp(parse_datetime(dt_string))
+    except (TypeError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _format_day(days):
+    return (_EPOCH + timedelta(days=days)).date().isoformat()
+
+
+def format_timestamp(ts):
+    """The canonical datetime text for a timestamp: YYYY-MM-DDTHH:MM."""
+    # Called for every row of every list response, so the date part is
+    # formatted once per day instead of through a datetime each time
+    days, seconds = divmod(ts, 86400)
+    hours, minutes = divmod(seconds // 60, 60)
+    return f"{_format_day(days)}T{hours:02d}:{minutes:02d}"
+
+
+class Status(str, Enum):
+    SCHEDULED = 'scheduled'
+    CANCELLED = 'cancelled'
+    COMPLETED = 'completed'
+
+
+def parse_status(value):
+    """Maps known status strings to Status; anything else is kept as-is."""
+    try:
+        return Status(value)
+    except ValueError:
+        return value
+
+
+class Appointment:
+    """
+    Compact in-memory form of one appointment.
+
+    The slot is held as a timestamp (see to_timestamp) instead of an ISO
+    string, so conflict checks and sorting never re-parse it. The original
+    text is only kept when it differs from the canonical YYYY-MM-DDTHH:MM
+    form (e.g. it has seconds, or can't be parsed at all). Unknown keys from
+    the JSON file are carried along in `extra`.
+
+    to_dict() gives back the dict stored in appointments.json and returned
+    by the API.
+    """
+    __slots__ = ('appointment_id', 'doctor_id', 'patient_name', 'phone_number',
+                 'ts', 'status', '_datetime', 'extra')
+
+    FIELDS = ('appointment_id', 'doctor_id', 'patient_name', 'datetime', 'phone_number', 'status')
+
+    def __init__(self, appointment_id, doctor_id, patient_name, dt_string, phone_number,
+                 status=Status.SCHEDULED, ts=None, extra=None):
+        if ts is None:
+            ts = parse_timestamp(dt_string)
+        self.appointment_id = appointment_id
+        self.doctor_id = doctor_id
+        self.patient_name = patient_name
+        self.phone_number = phone_number
+        self.ts = ts
+        self.status = parse_status(status)
+        self._datetime = None if ts is not None and format_timestamp(ts) == dt_string else dt_string
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, data):
+        extra = {key: value for key, value in data.items() if key not in cls.FIELDS}
+        return cls(
+            data['appointment_id'], data['doctor_id'], data.get('patient_name'),
+            data.get('datetime'), data.get('phone_number'), data.get('status', Status.SCHEDULED),
+            extra=extra
+        )
+
+    @property
+    def datetime(self):
+        if self._datetime is not None or self.ts is None:
+            return self._datetime
+        return format_timestamp(self.ts)
+
+    def to_dict(self):
+        status = self.status
+        data = {
+            "appointment_id": self.appointment_id,
+            "doctor_id": self.doctor_id,
+            "patient_name": self.patient_name,
+            "datetime": self.datetime,
+            "phone_number": self.phone_number,
+            "status": status.value if isinstance(status, Status) else status
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __repr__(self):
+        return f"Appointment({self.to_dict()!r})"
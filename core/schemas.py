@@ -0,0 +1,23 @@
+# file: core/schemas.py
+#
+# Request models shared by api.py and the MCP server's in-process transport,
+# so both validate and coerce bookings the same way.
+
+from typing import List
+
+from pydantic import BaseModel, Field
+
+
+class AppointmentRequest(BaseModel):
+    doctor_id: int
+    patient_name: str
+    phone_number: str # <-- NEW
+    datetime: str = Field(..., example="2025-11-20T14:30:00")
+
+
+# Upper bound on items per batch request
+MAX_BATCH_SIZE = 1000
+
+
+class AppointmentBatchRequest(BaseModel):
+    appointments: List[AppointmentRequest] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
@@ -0,0 +1,708 @@
+# file: core/storage.py
+
+import bisect
+import heapq
+import json
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime, time
+from pathlib import Path
+
+from core import metrics
+from core.history import HistoryStore
+from core.journal import AppointmentJournal, write_json_atomic
+from core.records import Appointment, parse_timestamp, to_timestamp
+
+STORAGE_MODES = ('json', 'journal', 'sqlite')
+
+# Sort key used for rows whose datetime can't be parsed; they order first.
+UNKNOWN_TS = -(2 ** 62)
+
+# How many booked slots a conflict check bisects (JSON modes; SQLite uses its index)
+CONFLICT_SCAN_SIZE = metrics.histogram(
+    'scheduler_conflict_scan_size', "Size of the doctor's slot list searched per conflict check.",
+    buckets=metrics.SIZE_BUCKETS
+)
+
+
+def load_json_list(filepath):
+    try:
+        with open(filepath, 'r') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, FileNotFoundError):
+        return []
+
+
+def _order_ts(ts):
+    return UNKNOWN_TS if ts is None else ts
+
+
+def _remove_sorted(index, key, ts):
+    """Removes one occurrence of `ts` from the sorted list index[key]."""
+    slots = index.get(key)
+    if not slots:
+        return
+    i = bisect.bisect_left(slots, ts)
+    if i < len(slots) and slots[i] == ts:
+        del slots[i]
+
+
+def _row_key(row):
+    ts, appt = row
+    return ts, appt.appointment_id
+
+
+def create_storage(data_path, mode='json', lazy_history=False):
+    """
+    Builds the storage backend for `mode` (one of STORAGE_MODES).
+    lazy_history applies to the json and journal modes; SQLite already reads
+    from disk on demand.
+    """
+    data_path = Path(data_path)
+    if mode == 'json':
+        return JSONStorage(data_path, lazy_history=lazy_history)
+    if mode == 'journal':
+        return JSONStorage(data_path, journal=True, lazy_history=lazy_history)
+    if mode == 'sqlite':
+        return SQLiteStorage(data_path / 'appointments.db', import_from=data_path)
+    raise ValueError(f"Unknown storage mode: {mode}")
+
+
+class JSONStorage:
+    """
+    The original storage: every appointment lives in memory (as a
+    core.records.Appointment) and is persisted to data/appointments.json as a
+    list of dicts. With journal=True changes are appended to a write-ahead
+    log instead of rewriting the file.
+
+    Queries are answered from in-memory indexes built once at startup:
+    appointments by id, sorted slot timestamps per doctor and per phone
+    number, and the set of known doctor ids. A short internal lock keeps the
+    indexes consistent; callers serialize commit() themselves.
+
+    Only one process may use a data folder at a time; with several API
+    workers, use SQLiteStorage.
+
+    archive() moves past appointments out of memory into month partitions
+    under data/history/ (see core/history.py); queries that reach back that
+    far read them on demand. With lazy_history=True everything before today
+    is archived at startup, so only the upcoming appointments are loaded.
+    Archived appointments are read-only: get(), replace() and delete() only
+    see the hot set.
+    """
+    # The data lives in this process's memory
+    shared = False
+    # archive() moves past appointments into history partitions
+    archives = True
+
+    def __init__(self, data_path, journal=False, lazy_history=False):
+        self.data_path = Path(data_path)
+        self.doctors_file = self.data_path / 'doctors.json'
+        self.appointments_file = self.data_path / 'appointments.json'
+        self._ensure_data_files_exist()
+
+        self.doctors = load_json_list(self.doctors_file)
+        self._doctor_ids = {doc['doctor_id'] for doc in self.doctors}
+        appointments = load_json_list(self.appointments_file)
+
+        self.journal = None
+        if journal:
+            self.journal = AppointmentJournal(self.appointments_file, lambda: self.appointments)
+            appointments = self.journal.replay(appointments)
+        self.history = HistoryStore(self.data_path / 'history')
+        self._pending = []
+        self._lock = threading.RLock()
+        # Held by archive() and by reads that combine history and hot rows,
+        # so they never see an appointment in both places or in neither.
+        self._archive_lock = threading.Lock()
+
+        # appointment_id -> Appointment, in insertion (file) order. Rows are
+        # converted one at a time and their dicts dropped straight away, so
+        # the parsed JSON and the records never both sit in memory in full.
+        self._by_id = {}
+        appointments.reverse()
+        while appointments:
+            appt = Appointment.from_dict(appointments.pop())
+            self._by_id[appt.appointment_id] = appt
+        # doctor_id / phone_number -> sorted list of slot timestamps
+        self._doctor_slots = {}
+        self._phone_slots = {}
+        self._build_indexes()
+
+        # Opened last: a startup compaction reads the loaded appointments
+        if self.journal is not None:
+            self.journal.open()
+        if lazy_history:
+            self.archive(to_timestamp(datetime.combine(date.today(), time())))
+        elif self.history.initialized:
+            # Finishes an archive run that was interrupted by a crash
+            self.archive(self.history.boundary)
+
+    @property
+    def appointments(self):
+        with self._lock:
+            return list(self._by_id.values())
+
+    # --- Archiving ---
+    def archive(self, before_ts):
+        """
+        Moves every appointment before `before_ts` into the history
+        partitions and returns how many were moved. Callers serialize it
+        with commit().
+        """
+        with self._archive_lock, self._lock:
+            past = [appt for appt in self._by_id.values() if appt.ts is not None and appt.ts < before_ts]
+            # Partitions, then the manifest, then the hot file: after a crash
+            # the rows are still in the hot file and the next start moves
+            # them again (adding to a partition skips known ids).
+            self.history.add(past)
+            self.history.set_boundary(before_ts)
+            if not past:
+                return 0
+            for appt in past:
+                del self._by_id[appt.appointment_id]
+            self._build_indexes()
+            if self.journal is None:
+                write_json_atomic(self.appointments_file, list(self._by_id.values()))
+            else:
+                self.journal.compact(wait=True)
+            return len(past)
+
+    def history_months(self):
+        return self.history.months()
+
+    def query_history(self, **filters):
+        """Like query(), but over the archived appointments only."""
+        return self.history.query(**filters)
+
+    def _reaches_history(self, start_ts):
+        return self.history.initialized and (start_ts is None or start_ts < self.history.boundary)
+
+    def _ensure_data_files_exist(self):
+        self.data_path.mkdir(exist_ok=True)
+        if not self.doctors_file.exists():
+            with open(self.doctors_file, 'w') as f:
+                json.dump([], f)
+        if not self.appointments_file.exists():
+            with open(self.appointments_file, 'w') as f:
+                json.dump([], f)
+
+    # --- Indexes ---
+    def _build_indexes(self):
+        """Builds the sorted indexes from the already-parsed timestamps."""
+        self._doctor_slots = {}
+        self._phone_slots = {}
+        self._order = []
+        for appt in self._by_id.values():
+            ts = appt.ts
+            self._order.append((_order_ts(ts), appt.appointment_id))
+            if ts is None:
+                continue # Unparseable rows can never conflict with anything
+            self._doctor_slots.setdefault(appt.doctor_id, []).append(ts)
+            self._phone_slots.setdefault(appt.phone_number, []).append(ts)
+        for slots in self._doctor_slots.values():
+            slots.sort()
+        for slots in self._phone_slots.values():
+            slots.sort()
+        self._order.sort()
+
+    def _index_add(self, appt):
+        ts = appt.ts
+        bisect.insort(self._order, (_order_ts(ts), appt.appointment_id))
+        if ts is None:
+            return
+        bisect.insort(self._doctor_slots.setdefault(appt.doctor_id, []), ts)
+        bisect.insort(self._phone_slots.setdefault(appt.phone_number, []), ts)
+
+    def _index_remove(self, appt):
+        ts = appt.ts
+        key = (_order_ts(ts), appt.appointment_id)
+        i = bisect.bisect_left(self._order, key)
+        if i < len(self._order) and self._order[i] == key:
+            del self._order[i]
+        if ts is None:
+            return
+        _remove_sorted(self._doctor_slots, appt.doctor_id, ts)
+        _remove_sorted(self._phone_slots, appt.phone_number, ts)
+
+    # --- Queries ---
+    def get_doctors(self):
+        return self.doctors
+
+    def doctor_exists(self, doctor_id):
+        return doctor_id in self._doctor_ids
+
+    def get(self, appointment_id):
+        return self._by_id.get(appointment_id)
+
+    def has_conflict(self, doctor_id, start_ts, end_ts, exclude=None):
+        """
+        True if the doctor has any slot within [start_ts, end_ts], not
+        counting the slot of the appointment `exclude`.
+        """
+        skip_ts = exclude.ts if exclude is not None and exclude.doctor_id == doctor_id else None
+        with self._lock:
+            slots = self._doctor_slots.get(doctor_id)
+            CONFLICT_SCAN_SIZE.observe(len(slots) if slots else 0)
+            if slots:
+                i = bisect.bisect_left(slots, start_ts)
+                if skip_ts is not None and i < len(slots) and slots[i] == skip_ts:
+                    i += 1  # its own slot; a second appointment at that time still conflicts
+                if i < len(slots) and slots[i] <= end_ts:
+                    return True
+        # Only a booking just after midnight can reach back into history
+        if self._reaches_history(start_ts):
+            return bool(self.history.doctor_slots(doctor_id, start_ts, end_ts))
+        return False
+
+    def doctor_slots(self, doctor_id, start_ts, end_ts):
+        """Sorted timestamps of the doctor's appointments within [start_ts, end_ts]."""
+        with self._lock:
+            slots = self._doctor_slots.get(doctor_id, [])
+            i = bisect.bisect_left(slots, start_ts)
+            j = bisect.bisect_right(slots, end_ts)
+            slots = slots[i:j]
+        if self._reaches_history(start_ts):
+            slots = list(heapq.merge(self.history.doctor_slots(doctor_id, start_ts, end_ts), slots))
+        return slots
+
+    def count_upcoming_for_phone(self, phone_number, now):
+        with self._lock:
+            slots = self._phone_slots.get(phone_number)
+            if not slots:
+                return 0
+            return len(slots) - bisect.bisect_left(slots, to_timestamp(now))
+
+    def get_all_appointments(self):
+        if self.history.initialized:
+            return [appt for _, appt in self.query()]
+        with self._lock:
+            return [self._by_id[appointment_id] for _, appointment_id in self._order]
+
+    def get_upcoming_appointments(self, now):
+        with self._lock:
+            i = bisect.bisect_left(self._order, (to_timestamp(now),))
+            return [self._by_id[appointment_id] for _, appointment_id in self._order[i:]]
+
+    def stats(self, now_ts, today_end_ts, week_end_ts):
+        """
+        Appointment counts around `now_ts`, read off the sorted indexes:
+        upcoming (from now on), today and this_week (from now until the given
+        ends), completed (before now, archived ones included) and
+        upcoming_by_doctor. Rows without a valid datetime are not counted.
+        """
+        with self._lock:
+            order = self._order
+            first_dated = bisect.bisect_left(order, (UNKNOWN_TS + 1,))
+            now_i = bisect.bisect_left(order, (now_ts,))
+            stats = {
+                "upcoming": len(order) - now_i,
+                "today": bisect.bisect_left(order, (today_end_ts,)) - now_i,
+                "this_week": bisect.bisect_left(order, (week_end_ts,)) - now_i,
+                "completed": now_i - first_dated,
+                "upcoming_by_doctor": {
+                    doctor_id: len(slots) - bisect.bisect_left(slots, now_ts)
+                    for doctor_id, slots in self._doctor_slots.items()
+                }
+            }
+        if self.history.initialized:
+            stats["completed"] += self.history.count()
+        return stats
+
+    def query(self, doctor_id=None, phone_number=None, status=None,
+              start_ts=None, end_ts=None, after=None, limit=None):
+        """
+        Walks the time-ordered index and returns up to `limit` (ts, appointment)
+        pairs matching the filters, ordered by (ts, appointment_id). Times are
+        half-open: start_ts <= ts < end_ts. `after` is the (ts, appointment_id)
+        key of the last row of the previous page.
+        """
+        filters = dict(doctor_id=doctor_id, phone_number=phone_number, status=status)
+        if not self._reaches_history(start_ts) or (after is not None and after[0] >= self.history.boundary):
+            return self._query_hot(start_ts=start_ts, end_ts=end_ts, after=after, limit=limit, **filters)
+        with self._archive_lock:
+            archived = self.history.query(start_ts=start_ts, end_ts=end_ts, after=after, limit=limit, **filters)
+            results = self._query_hot(start_ts=start_ts, end_ts=end_ts, after=after, limit=limit, **filters)
+        results = list(heapq.merge(archived, results, key=_row_key))
+        return results[:limit] if limit is not None else results
+
+    def _query_hot(self, doctor_id=None, phone_number=None, status=None,
+                   start_ts=None, end_ts=None, after=None, limit=None):
+        results = []
+        with self._lock:
+            order = self._order
+            if after is not None:
+                i = bisect.bisect_right(order, tuple(after))
+            else:
+                i = 0
+            if start_ts is not None:
+                i = max(i, bisect.bisect_left(order, (start_ts,)))
+            for j in range(i, len(order)):
+                ts, appointment_id = order[j]
+                if end_ts is not None and ts >= end_ts:
+                    break
+                appt = self._by_id[appointment_id]
+                if doctor_id is not None and appt.doctor_id != doctor_id:
+                    continue
+                if phone_number is not None and appt.phone_number != phone_number:
+                    continue
+                if status is not None and appt.status != status:
+                    continue
+                results.append((ts, appt))
+                if limit is not None and len(results) >= limit:
+                    break
+        return results
+
+    # --- Mutations (persisted by commit) ---
+    def transaction(self):
+        """Nothing to do: the scheduler's locks already serialize writers."""
+        return nullcontext()
+
+    def insert(self, appointment):
+        with self._lock:
+            self._by_id[appointment.appointment_id] = appointment
+            self._index_add(appointment)
+            self._pending.append(('add', appointment))
+
+    def delete(self, appointment_id):
+        with self._lock:
+            appt = self._by_id.pop(appointment_id, None)
+            if appt is None:
+                return False
+            self._index_remove(appt)
+            self._pending.append(('cancel', appointment_id))
+            return True
+
+    def replace(self, old, new):
+        """
+        Swaps `old` for `new` (same appointment_id, e.g. moved to another
+        time), keeping its place in the file. False if `old` is gone.
+        """
+        with self._lock:
+            if self._by_id.get(old.appointment_id) is not old:
+                return False
+            self._index_remove(old)
+            self._by_id[new.appointment_id] = new
+            self._index_add(new)
+            self._pending.append(('update', new))
+            return True
+
+    def commit(self):
+        """
+        Persists everything inserted or deleted since the last commit. When
+        several threads commit back to back, the first one writes all of their
+        changes and the others find nothing pending.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+            snapshot = list(self._by_id.values()) if pending and self.journal is None else None
+        if not pending:
+            return
+        if self.journal is None:
+            write_json_atomic(self.appointments_file, snapshot)
+            return
+        for op, payload in pending:
+            if op == 'add':
+                self.journal.append_add(payload)
+            elif op == 'update':
+                self.journal.append_update(payload)
+            else:
+                self.journal.append_cancel(payload)
+
+    def close(self):
+        """Flushes any journaled changes to disk."""
+        if self.journal is not None:
+            self.journal.close()
+
+
+class SQLiteStorage:
+    """
+    Stores doctors and appointments in a SQLite database. Conflict checks, the
+    per-phone limit, cancel-by-id and the upcoming list are indexed queries.
+
+    If the database is empty and `import_from` is a folder containing the
+    JSON data files, they are imported on first start.
+
+    Several processes (e.g. `uvicorn --workers N`) can share one database:
+    it runs in WAL mode, so readers never wait for the writer, and every
+    mutation runs inside transaction(), which holds the database's write
+    lock from the first check to the commit. The change log (see
+    log_change) and the instance id live in the database too, so every
+    process reports the same data versions.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS doctors (
+            doctor_id INTEGER PRIMARY KEY,
+            name TEXT,
+            specialty TEXT
+        );
+        CREATE TABLE IF NOT EXISTS appointments (
+            appointment_id TEXT PRIMARY KEY,
+            doctor_id INTEGER NOT NULL,
+            patient_name TEXT,
+            datetime TEXT NOT NULL,
+            ts INTEGER,
+            phone_number TEXT,
+            status TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_appointments_doctor_ts ON appointments (doctor_id, ts);
+        CREATE INDEX IF NOT EXISTS idx_appointments_phone_ts ON appointments (phone_number, ts);
+        CREATE INDEX IF NOT EXISTS idx_appointments_ts ON appointments (ts);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            event TEXT NOT NULL
+        );
+    """
+    KEYS = ('appointment_id', 'doctor_id', 'patient_name', 'datetime', 'phone_number', 'status')
+    COLUMNS = ", ".join(KEYS)
+
+    # Other processes see every change through the database
+    shared = True
+    archives = False
+
+    def __init__(self, db_file, import_from=None):
+        self.db_file = Path(db_file)
+        self.db_file.parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by all threads, serialized by self._lock.
+        # `timeout` is how long to wait for another process's write lock.
+        self.conn = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False)
+        self._lock = threading.RLock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # Commits still reach the WAL file; only a power loss can undo the last ones
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+        with self.transaction():
+            # Workers starting together must not import twice or pick different ids
+            if import_from is not None and self._is_empty():
+                data_path = Path(import_from)
+                self.import_json(data_path / 'doctors.json', data_path / 'appointments.json')
+            self.conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('instance_id', ?)", (uuid.uuid4().hex[:12],)
+            )
+            self.instance_id = self.conn.execute("SELECT value FROM meta WHERE key = 'instance_id'").fetchone()[0]
+
+    def _is_empty(self):
+        row = self.conn.execute(
+            "SELECT (SELECT COUNT(*) FROM doctors) + (SELECT COUNT(*) FROM appointments)"
+        ).fetchone()
+        return row[0] == 0
+
+    def import_json(self, doctors_file, appointments_file):
+        """Bulk-loads the JSON data files; existing ids are left untouched."""
+        doctors = load_json_list(doctors_file)
+        appointments = load_json_list(appointments_file)
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO doctors (doctor_id, name, specialty) VALUES (?, ?, ?)",
+                [(doc['doctor_id'], doc.get('name'), doc.get('specialty')) for doc in doctors]
+            )
+            self.conn.executemany(
+                f"INSERT OR IGNORE INTO appointments ({self.COLUMNS}, ts) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [self._row(appt, _order_ts(parse_timestamp(appt.get('datetime')))) for appt in appointments]
+            )
+        return len(doctors), len(appointments)
+
+    def _record(self, row):
+        """Builds an Appointment from a `SELECT {COLUMNS}, ts` row."""
+        ts = row[6]
+        return Appointment(*row[:6], ts=None if ts == UNKNOWN_TS else ts)
+
+    def _appointments(self, rows):
+        record = self._record
+        return [record(row) for row in rows]
+
+    def _row(self, appt, ts):
+        return (
+            appt['appointment_id'], appt['doctor_id'], appt.get('patient_name'),
+            appt['datetime'], appt.get('phone_number'), appt.get('status', 'scheduled'), ts
+        )
+
+    def _fetchall(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _fetchone(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchone()
+
+    # --- Queries ---
+    def get_doctors(self):
+        rows = self._fetchall("SELECT doctor_id, name, specialty FROM doctors ORDER BY doctor_id")
+        return [dict(zip(('doctor_id', 'name', 'specialty'), row)) for row in rows]
+
+    def doctor_exists(self, doctor_id):
+        return self._fetchone("SELECT 1 FROM doctors WHERE doctor_id = ?", (doctor_id,)) is not None
+
+    def get(self, appointment_id):
+        row = self._fetchone(
+            f"SELECT {self.COLUMNS}, ts FROM appointments WHERE appointment_id = ?", (appointment_id,)
+        )
+        return self._record(row) if row else None
+
+    def has_conflict(self, doctor_id, start_ts, end_ts, exclude=None):
+        row = self._fetchone(
+            "SELECT 1 FROM appointments WHERE doctor_id = ? AND ts BETWEEN ? AND ? "
+            "AND appointment_id != ? LIMIT 1",
+            (doctor_id, start_ts, end_ts, exclude.appointment_id if exclude is not None else '')
+        )
+        return row is not None
+
+    def doctor_slots(self, doctor_id, start_ts, end_ts):
+        rows = self._fetchall(
+            "SELECT ts FROM appointments WHERE doctor_id = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+            (doctor_id, start_ts, end_ts)
+        )
+        return [row[0] for row in rows]
+
+    def count_upcoming_for_phone(self, phone_number, now):
+        row = self._fetchone(
+            "SELECT COUNT(*) FROM appointments WHERE phone_number = ? AND ts >= ?",
+            (phone_number, to_timestamp(now))
+        )
+        return row[0]
+
+    def get_all_appointments(self):
+        rows = self._fetchall(f"SELECT {self.COLUMNS}, ts FROM appointments ORDER BY ts, appointment_id")
+        return self._appointments(rows)
+
+    def get_upcoming_appointments(self, now):
+        rows = self._fetchall(
+            f"SELECT {self.COLUMNS}, ts FROM appointments WHERE ts >= ? ORDER BY ts, appointment_id",
+            (to_timestamp(now),)
+        )
+        return self._appointments(rows)
+
+    def stats(self, now_ts, today_end_ts, week_end_ts):
+        """
+        Same contract as JSONStorage.stats. Each count is a range over the ts
+        index, in one statement so they all see the same snapshot.
+        """
+        row = self._fetchone(
+            "SELECT (SELECT COUNT(*) FROM appointments WHERE ts >= ?), "
+            "(SELECT COUNT(*) FROM appointments WHERE ts >= ? AND ts < ?), "
+            "(SELECT COUNT(*) FROM appointments WHERE ts >= ? AND ts < ?), "
+            "(SELECT COUNT(*) FROM appointments WHERE ts > ? AND ts < ?)",
+            (now_ts, now_ts, today_end_ts, now_ts, week_end_ts, UNKNOWN_TS, now_ts)
+        )
+        rows = self._fetchall(
+            "SELECT doctor_id, COUNT(*) FROM appointments WHERE ts >= ? GROUP BY doctor_id", (now_ts,)
+        )
+        return {
+            "upcoming": row[0],
+            "today": row[1],
+            "this_week": row[2],
+            "completed": row[3],
+            "upcoming_by_doctor": dict(rows)
+        }
+
+    def query(self, doctor_id=None, phone_number=None, status=None,
+              start_ts=None, end_ts=None, after=None, limit=None):
+        """Same contract as JSONStorage.query, as one indexed SELECT."""
+        clauses, params = [], []
+        for column, value in (('doctor_id', doctor_id), ('phone_number', phone_number), ('status', status)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if start_ts is not None:
+            clauses.append("ts >= ?")
+            params.append(start_ts)
+        if end_ts is not None:
+            clauses.append("ts < ?")
+            params.append(end_ts)
+        if after is not None:
+            clauses.append("(ts, appointment_id) > (?, ?)")
+            params.extend(after)
+        sql = f"SELECT {self.COLUMNS}, ts FROM appointments"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY ts, appointment_id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        record = self._record
+        return [(row[6], record(row)) for row in self._fetchall(sql, params)]
+
+    # --- Mutations (persisted by commit) ---
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the block as one write transaction, started with BEGIN IMMEDIATE
+        so it holds the database's write lock from its first read: checks
+        made inside can't be invalidated by another process before the
+        commit. Commits at the end unless commit() already did; rolls back on
+        errors. Nested calls join the outer transaction.
+        """
+        with self._lock:
+            if self.conn.in_transaction:
+                yield
+                return
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.conn.rollback()
+                raise
+            if self.conn.in_transaction:
+                self.conn.commit()
+
+    def insert(self, appointment):
+        with self._lock:
+            self.conn.execute(
+                f"INSERT INTO appointments ({self.COLUMNS}, ts) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                self._row(appointment.to_dict(), _order_ts(appointment.ts))
+            )
+
+    def delete(self, appointment_id):
+        with self._lock:
+            cursor = self.conn.execute("DELETE FROM appointments WHERE appointment_id = ?", (appointment_id,))
+            return cursor.rowcount > 0
+
+    def replace(self, old, new):
+        row = self._row(new.to_dict(), _order_ts(new.ts))
+        with self._lock:
+            cursor = self.conn.execute(
+                f"UPDATE appointments SET ({self.COLUMNS}, ts) = (?, ?, ?, ?, ?, ?, ?) WHERE appointment_id = ?",
+                row + (old.appointment_id,)
+            )
+            return cursor.rowcount > 0
+
+    def commit(self):
+        with self._lock:
+            self.conn.commit()
+
+    # --- Change log, shared by all processes ---
+    def log_change(self, event, keep):
+        """
+        Appends `event` to the change log in the current transaction and
+        returns its sequence number. Only the newest `keep` events are kept.
+        """
+        with self._lock:
+            seq = self.conn.execute("INSERT INTO changes (event) VALUES (?)", (json.dumps(event),)).lastrowid
+            self.conn.execute("DELETE FROM changes WHERE seq <= ?", (seq - keep,))
+            return seq
+
+    def changes_after(self, seq):
+        """The logged (seq, event) pairs after `seq`, oldest first."""
+        rows = self._fetchall("SELECT seq, event FROM changes WHERE seq > ? ORDER BY seq", (seq,))
+        return [(row_seq, json.loads(event)) for row_seq, event in rows]
+
+    # --- Archiving (not needed: queries are indexed and nothing is held in memory) ---
+    def archive(self, before_ts):
+        raise ValueError("Archiving is only available with json or journal storage.")
+
+    def history_months(self):
+        return []
+
+    def query_history(self, **filters):
+        return []
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
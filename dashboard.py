@@ -3,30 +3,157 @@
 import streamlit as st
 import requests
 import pandas as pd
-from datetime import datetime, timedelta
+import numpy as np
+from datetime import datetime
 
 # --- Configuration ---
 API_BASE_URL = "http://127.0.0.1:8000"
+# Seconds between checks for new data while "Live updates" is on
+LIVE_REFRESH_SECONDS = 5
 
 # --- Helper Functions ---
-def get_doctors():
+# Responses are cached per data version (the API's ETag / change-feed
+# position, which also changes when the API restarts), so a rerun only
+# downloads data again after a booking, cancellation or archive run. Failed
+# requests raise inside the cached function, and exceptions are never cached.
+def api_get(path, params=None):
+    response = requests.get(f"{API_BASE_URL}{path}", params=params)
+    response.raise_for_status()
+    return response.json()
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def fetch_json(path, version, params=None):
+    return api_get(path, params)
+
+# Stats depend on the clock as well as on the data, so they also expire.
+@st.cache_data(ttl=60, max_entries=4, show_spinner=False)
+def fetch_stats(version):
+    return api_get("/stats")
+
+def get_data_version():
     try:
-        response = requests.get(f"{API_BASE_URL}/doctors")
-        response.raise_for_status()
-        return response.json()
+        return api_get("/version")["etag"]
+    except requests.exceptions.RequestException:
+        return None
+
+def get_doctors(version):
+    try:
+        return fetch_json("/doctors", version)
     except requests.exceptions.RequestException as e:
         st.error(f"Error fetching doctors: {e}")
         return []
 
-def get_appointments():
+def get_appointments(version, params=None):
     try:
-        response = requests.get(f"{API_BASE_URL}/appointments")
-        response.raise_for_status()
-        return response.json()
+        return fetch_json("/appointments", version, params)
     except requests.exceptions.RequestException as e:
         st.error(f"Error fetching appointments: API server might not be running.")
         return []
 
+def get_stats(version):
+    """Server-side totals for the metrics and the doctor directory."""
+    try:
+        return fetch_stats(version)
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error fetching stats: {e}")
+        return None
+
+def follow_upcoming(start):
+    """
+    Appointments from `start` (ISO datetime) on, kept in the session and
+    brought up to date from the API's change feed (GET /changes) instead of
+    being downloaded again. They are reloaded in full on the first run, when
+    `start` moves to a new day, or when the API can no longer replay the
+    changes (410: restarted or too far behind).
+    Returns (appointments, version) for the cached loaders.
+    """
+    state = st.session_state
+    if state.get("upcoming_start") == start and state.get("upcoming_token"):
+        try:
+            changes = api_get("/changes", {"since": state.upcoming_token})
+        except requests.exceptions.HTTPError:
+            changes = None
+        except requests.exceptions.RequestException as e:
+            st.error(f"Error fetching appointments: API server might not be running.")
+            return [], None
+        if changes is not None:
+            upcoming = state.upcoming
+            for event in changes["events"]:
+                if event["type"] != "appointments":
+                    continue  # archiving only moves appointments before today
+                # New bookings are never in the past, so all of them belong here
+                for appt in event["created"]:
+                    upcoming[appt["appointment_id"]] = appt
+                # Appointments are only moved to future times too
+                for appt in event["updated"]:
+                    upcoming[appt["appointment_id"]] = appt
+                for appointment_id in event["cancelled"]:
+                    upcoming.pop(appointment_id, None)
+            state.upcoming_token = changes["last_event_id"]
+            return list(upcoming.values()), state.upcoming_token
+
+    # Read the version before the data, so replaying from it can't miss a change
+    version = get_data_version()
+    appointments = get_appointments(version, {"start": start})
+    state.upcoming = {appt["appointment_id"]: appt for appt in appointments}
+    state.upcoming_start = start
+    state.upcoming_token = version.strip('"') if version else None
+    return appointments, state.upcoming_token
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def watch_for_changes(version):
+    """Reruns the page as soon as the API reports newer data than `version`."""
+    latest = get_data_version()
+    if latest is not None and latest.strip('"') != version:
+        st.rerun()
+
+def get_history_months(version):
+    try:
+        return fetch_json("/history/months", version)
+    except requests.exceptions.RequestException:
+        return []
+
+def get_history(version, month):
+    """Archived appointments of one month (YYYY-MM), read from data/history/."""
+    try:
+        return fetch_json("/history", version, {"month": month})
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error fetching appointment history: {e}")
+        return []
+
+def with_doctors(appointments, df_doctors):
+    """Appointments as a DataFrame, with doctor name and specialty merged in."""
+    df_appointments = pd.DataFrame(appointments)
+    if 'doctor_id' in df_appointments.columns and 'doctor_id' in df_doctors.columns:
+        df = pd.merge(df_appointments, df_doctors, on="doctor_id", how="left", suffixes=('', '_doctor'))
+    else:
+        df = df_appointments
+    # One vectorized parse; unreadable datetimes become NaT instead of failing
+    df['datetime_obj'] = pd.to_datetime(df['datetime'], format='ISO8601', errors='coerce')
+    return df
+
+# Urgency by whole hours until the appointment: (upper bound, label)
+URGENCY_LEVELS = [(2, "URGENT"), (24, "HIGH PRIORITY")]
+URGENCY_DEFAULT = "SCHEDULED"
+URGENCY_ICONS = {"URGENT": "🔴", "HIGH PRIORITY": "🟠", "SCHEDULED": "🟢"}
+URGENCY_COLORS = {"URGENT": "#ff4444", "HIGH PRIORITY": "#ff9900", "SCHEDULED": "#00cc00"}
+
+def with_urgency(df, now):
+    """Adds hours_until, urgency, urgency_icon and urgency_color columns."""
+    hours_until = ((df['datetime_obj'] - now).dt.total_seconds() // 3600).astype(int)
+    urgency = np.select(
+        [hours_until <= limit for limit, _ in URGENCY_LEVELS],
+        [label for _, label in URGENCY_LEVELS],
+        URGENCY_DEFAULT
+    )
+    df = df.assign(hours_until=hours_until, urgency=urgency)
+    df['urgency_icon'] = df['urgency'].map(URGENCY_ICONS)
+    df['urgency_color'] = df['urgency'].map(URGENCY_COLORS)
+    return df
+
+# Appointment cards rendered per page of the contact queue
+QUEUE_PAGE_SIZE = 25
+
 # --- Streamlit UI ---
 st.set_page_config(page_title="Appointments Dashboard", layout="wide")
 
@@ -34,44 +161,42 @@ st.title("🗓️ Appointment Scheduling Dashboard")
 st.markdown("Real-time appointment management and doctor directory")
 
 # --- Fetch Data ---
-appointments_data = get_appointments()
-doctors_data = get_doctors()
+# Metrics and the directory come pre-counted from /stats; the contact queue
+# only needs today onwards, so past (possibly archived) history is only
+# fetched by the history tab.
+now = datetime.now()
+start_of_today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+appointments_data, version = follow_upcoming(start_of_today.isoformat(timespec='minutes'))
+doctors_data = get_doctors(version)
+stats = get_stats(version)
+
+if st.sidebar.toggle("🔄 Live updates", help=f"Check for changes every {LIVE_REFRESH_SECONDS} seconds"):
+    watch_for_changes(version)
 
-if appointments_data and doctors_data:
+if doctors_data and stats:
     # --- Data Processing ---
-    df_appointments = pd.DataFrame(appointments_data)
     df_doctors = pd.DataFrame(doctors_data)
-    
-    # Merge to get doctor information
-    if 'doctor_id' in df_appointments.columns and 'doctor_id' in df_doctors.columns:
-        df = pd.merge(df_appointments, df_doctors, on="doctor_id", how="left", suffixes=('', '_doctor'))
-    else:
-        df = df_appointments
-    
-    # Convert datetime string to datetime object
-    df['datetime_obj'] = pd.to_datetime(df['datetime'])
-    
+    df = with_doctors(appointments_data, df_doctors) if appointments_data else pd.DataFrame()
+
     # Filter for upcoming appointments only
-    now = datetime.now()
-    df_upcoming = df[df['datetime_obj'] > now].sort_values(by='datetime_obj').reset_index(drop=True)
+    if not df.empty:
+        df_upcoming = df[df['datetime_obj'] > now].sort_values(by='datetime_obj').reset_index(drop=True)
+    else:
+        df_upcoming = pd.DataFrame({
+            'doctor_id': pd.Series(dtype='int64'),
+            'datetime_obj': pd.Series(dtype='datetime64[ns]')
+        })
+    df_upcoming = with_urgency(df_upcoming, now)
 
     # --- Key Metrics ---
     st.subheader("📊 Quick Metrics")
     
     col1, col2, col3, col4 = st.columns(4)
     
-    start_of_week = now - timedelta(days=now.weekday())
-    end_of_week = start_of_week + timedelta(days=6)
-    
-    appointments_this_week = df_upcoming[
-        (df_upcoming['datetime_obj'].dt.date >= start_of_week.date()) & 
-        (df_upcoming['datetime_obj'].dt.date <= end_of_week.date())
-    ].shape[0]
-    
-    col1.metric("📅 Total Upcoming", len(df_upcoming))
-    col2.metric("🔔 This Week", appointments_this_week)
-    col3.metric("👨‍⚕️ Active Doctors", len(df_doctors))
-    col4.metric("⏰ Today's Appointments", df_upcoming[df_upcoming['datetime_obj'].dt.date == now.date()].shape[0])
+    col1.metric("📅 Total Upcoming", stats["upcoming"])
+    col2.metric("🔔 This Week", stats["this_week"])
+    col3.metric("👨‍⚕️ Active Doctors", len(stats["doctors"]))
+    col4.metric("⏰ Today's Appointments", stats["today"])
     
     st.divider()
 
@@ -83,25 +208,17 @@ if appointments_data and doctors_data:
         st.subheader("Upcoming Appointments - Call Reminders")
         
         if not df_upcoming.empty:
-            # Sort by datetime to show earliest first
-            df_upcoming_sorted = df_upcoming.sort_values(by='datetime_obj')
+            # Already sorted earliest first; only one page of cards is built per run
+            total = len(df_upcoming)
+            pages = (total + QUEUE_PAGE_SIZE - 1) // QUEUE_PAGE_SIZE
+            page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1)
+            first = (page - 1) * QUEUE_PAGE_SIZE
+            df_page = df_upcoming.iloc[first:first + QUEUE_PAGE_SIZE].copy()
+            df_page['time_label'] = df_page['datetime_obj'].dt.strftime('%A, %B %d at %I:%M %p')
+            st.caption(f"Showing {first + 1}–{first + len(df_page)} of {total} upcoming appointments")
             
-            for idx, appt in df_upcoming_sorted.iterrows():
-                # Create highlighted box for each appointment
-                appt_time = pd.to_datetime(appt['datetime_obj'])
-                time_until = appt_time - now
-                hours_until = int(time_until.total_seconds() / 3600)
-                
-                # Color code based on urgency
-                if hours_until <= 2:
-                    border_color = "🔴"
-                    urgency_label = "URGENT"
-                elif hours_until <= 24:
-                    border_color = "🟠"
-                    urgency_label = "HIGH PRIORITY"
-                else:
-                    border_color = "🟢"
-                    urgency_label = "SCHEDULED"
+            for appt in df_page.to_dict('records'):
+                hours_until = appt['hours_until']
                 
                 # Create a visually distinct box
                 with st.container():
@@ -112,14 +229,14 @@ if appointments_data and doctors_data:
                         <div style="
                             background-color: #f0f2f6;
                             padding: 15px;
-                            border-left: 5px solid {'#ff4444' if hours_until <= 2 else '#ff9900' if hours_until <= 24 else '#00cc00'};
+                            border-left: 5px solid {appt['urgency_color']};
                             border-radius: 5px;
                             margin: 10px 0;
                         ">
-                            <h4 style="margin: 0 0 10px 0;">{border_color} {appt.get('patient_name', 'N/A')} - {urgency_label}</h4>
+                            <h4 style="margin: 0 0 10px 0;">{appt['urgency_icon']} {appt.get('patient_name', 'N/A')} - {appt['urgency']}</h4>
                             <p style="margin: 5px 0;"><b>📱 Phone:</b> {appt.get('phone_number', 'N/A')}</p>
                             <p style="margin: 5px 0;"><b>👨‍⚕️ Doctor:</b> {appt.get('name', 'N/A')} ({appt.get('specialty', 'N/A')})</p>
-                            <p style="margin: 5px 0;"><b>🕐 Time:</b> {appt_time.strftime('%A, %B %d at %I:%M %p')}</p>
+                            <p style="margin: 5px 0;"><b>🕐 Time:</b> {appt['time_label']}</p>
                             <p style="margin: 5px 0; font-size: 12px; color: #666;"><b>ID:</b> {appt.get('appointment_id', 'N/A')}</p>
                         </div>
                         """, unsafe_allow_html=True)
@@ -133,20 +250,13 @@ if appointments_data and doctors_data:
     with tab2:
         st.subheader("Available Doctors")
         
-        if not df_doctors.empty:
-            # Get doctor stats
-            doctor_stats = {}
-            for _, doctor in df_doctors.iterrows():
-                doc_id = doctor['doctor_id']
-                appts_count = len(df_upcoming[df_upcoming['doctor_id'] == doc_id])
-                doctor_stats[doc_id] = appts_count
-            
+        if stats["doctors"]:
             # Display doctors in a grid
             cols = st.columns(2)
             
-            for idx, (_, doctor) in enumerate(df_doctors.iterrows()):
+            for idx, doctor in enumerate(stats["doctors"]):
                 doc_id = doctor['doctor_id']
-                upcoming_count = doctor_stats.get(doc_id, 0)
+                upcoming_count = doctor['upcoming']
                 
                 with cols[idx % 2]:
                     st.markdown(f"""
@@ -176,22 +286,29 @@ if appointments_data and doctors_data:
     # --- TAB 3: All Appointments History ---
     with tab3:
         st.subheader("Complete Appointment Records")
-        
+
+        # Archived months are loaded one at a time; "All" reads everything.
+        period = st.selectbox("Show", ["All"] + list(reversed(get_history_months(version))))
+        history_data = get_appointments(version) if period == "All" else get_history(version, period)
+        df = with_doctors(history_data, df_doctors) if history_data else pd.DataFrame()
+
         if not df.empty:
             # Prepare display dataframe
             df_display = df[['appointment_id', 'datetime', 'patient_name', 'phone_number', 'name', 'specialty']].copy()
             
+            # Add status column
+            df_display['Status'] = np.select(
+                [df['datetime_obj'].isna(), df['datetime_obj'] < now],
+                ['⚠️ Invalid date', '✅ Completed'],
+                '🔔 Upcoming'
+            )
+            
             # Rename columns for better display
-            df_display.columns = ['Appointment ID', 'Date & Time', 'Patient Name', 'Phone Number', 'Doctor', 'Specialty']
+            df_display.columns = ['Appointment ID', 'Date & Time', 'Patient Name', 'Phone Number', 'Doctor', 'Specialty', 'Status']
             
             # Sort by datetime (most recent first)
             df_display = df_display.sort_values(by='Date & Time', ascending=False)
             
-            # Add status column
-            df_display['Status'] = df_display['Date & Time'].apply(
-                lambda x: '✅ Completed' if pd.to_datetime(x) < now else '🔔 Upcoming'
-            )
-            
             # Reorder columns
             df_display = df_display[['Status', 'Date & Time', 'Patient Name', 'Phone Number', 'Doctor', 'Specialty', 'Appointment ID']]
             
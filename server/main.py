@@ -1,22 +1,364 @@
-import requests
+import asyncio
+import json
+import os
+import sys
+import time
+import httpx
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
 from mcp.server.fastmcp import FastMCP
-from typing import List, Dict, Any
+from pydantic import ValidationError
+from typing import List, Dict, Any, Optional
+
+API_BASE_URL = os.getenv("API_BASE_URL", "http://127.0.0.1:8000")
+
+# "http" (default) talks to api.py at API_BASE_URL.
+# "inprocess" calls core.scheduler.AppointmentScheduler directly; only use it
+# when this process is the only writer of the data folder.
+MCP_TRANSPORT = os.getenv("MCP_TRANSPORT", "http")
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SCHEDULER_DATA_FOLDER = os.getenv("SCHEDULER_DATA_FOLDER", str(REPO_ROOT / "data"))
+SCHEDULER_STORAGE = os.getenv("SCHEDULER_STORAGE", "json")
+SCHEDULER_LAZY_HISTORY = os.getenv("SCHEDULER_LAZY_HISTORY", "0").lower() in ("1", "true", "yes")
 
-API_BASE_URL = "http://127.0.0.1:8000"
+# How long (seconds) cached reads are served without asking the API. After
+# that doctors are revalidated with If-None-Match, which costs a 304 when
+# nothing changed, and appointment lists are brought up to date from the
+# API's change feed (GET /changes). Writes made through this server expire
+# the cached lists at once.
+DOCTORS_CACHE_TTL = float(os.getenv("MCP_DOCTORS_CACHE_TTL", "300"))
+APPOINTMENTS_CACHE_TTL = float(os.getenv("MCP_APPOINTMENTS_CACHE_TTL", "5"))
 
-mcp = FastMCP("AppointmentScheduler")
+# Connection pool and timeouts for the shared HTTP client (seconds)
+HTTP_MAX_CONNECTIONS = int(os.getenv("MCP_HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("MCP_HTTP_MAX_KEEPALIVE", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("MCP_HTTP_CONNECT_TIMEOUT", "2"))
+HTTP_TIMEOUT = float(os.getenv("MCP_HTTP_TIMEOUT", "10"))
 
-def http_error_handler(response: requests.Response) -> str:
+_client: Optional[httpx.AsyncClient] = None
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Returns the keep-alive client shared by every tool, creating it on first
+    use so it binds to the running event loop.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=API_BASE_URL,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE
+            ),
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+@asynccontextmanager
+async def mcp_lifespan(server: FastMCP):
     try:
-        details = response.json().get("detail", "No details provided.")
+        yield {}
+    finally:
+        await close_client()
+        close_transport()
+
+mcp = FastMCP("AppointmentScheduler", lifespan=mcp_lifespan)
+
+def error_detail(response: httpx.Response) -> Any:
+    try:
+        return response.json().get("detail", "No details provided.")
     except:
-        details = response.text
-    return f"Error {response.status_code}: {details}"
+        return response.text
+
+def http_error_handler(response: httpx.Response) -> str:
+    return f"Error {response.status_code}: {error_detail(response)}"
+
+class APIError(Exception):
+    """An error response from the API, formatted like http_error_handler."""
+    def __init__(self, status_code: int, detail: Any):
+        self.status_code = status_code
+        self.detail = detail
+        super().__init__(f"Error {status_code}: {detail}")
+
+def request_error(e: Exception) -> str:
+    return str(e) or e.__class__.__name__
+
+# ------------------ READ CACHE ------------------
+
+class ReadCache:
+    """
+    Remembers GET results with the ETag the API sent for them. Fresh entries
+    (younger than their TTL) are returned as-is; stale ones are revalidated.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Dict[str, Any]] = {}
+
+    def lookup(self, key: str, ttl: float):
+        """Returns (entry, is_fresh); entry is None on a miss."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+        return entry, time.monotonic() - entry["fetched_at"] < ttl
+
+    def store(self, key: str, etag: Optional[str], value: Any):
+        if etag:
+            self._entries[key] = {"etag": etag, "value": value, "fetched_at": time.monotonic()}
+
+    def touch(self, entry: Dict[str, Any]):
+        entry["fetched_at"] = time.monotonic()
+
+    def invalidate(self, prefix: str = ""):
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+    def expire(self, prefix: str = ""):
+        """Marks entries stale, keeping them for revalidation."""
+        for key, entry in self._entries.items():
+            if key.startswith(prefix):
+                entry["fetched_at"] = float("-inf")
+
+# ------------------ TRANSPORTS ------------------
+
+class HTTPTransport:
+    """Calls the FastAPI service over the shared keep-alive client."""
+
+    def __init__(self):
+        self.cache = ReadCache()
+
+    def _check(self, r: httpx.Response) -> Any:
+        if r.is_error:
+            raise APIError(r.status_code, error_detail(r))
+        return r.json()
+
+    async def _cached_get(self, path: str, ttl: float, params: Optional[Dict[str, Any]] = None) -> Any:
+        key = str(httpx.URL(path, params=params))
+        entry, fresh = self.cache.lookup(key, ttl)
+        if fresh:
+            return entry["value"]
+        headers = {"If-None-Match": entry["etag"]} if entry else None
+        r = await get_client().get(path, params=params, headers=headers)
+        if entry and r.status_code == 304:
+            self.cache.touch(entry)
+            return entry["value"]
+        value = self._check(r)
+        self.cache.store(key, r.headers.get("ETag"), value)
+        return value
+
+    async def get_doctors(self) -> List[Dict[str, Any]]:
+        return await self._cached_get("/doctors", DOCTORS_CACHE_TTL)
+
+    async def get_appointments(self, doctor_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        params = {"doctor_id": doctor_id} if doctor_id is not None else None
+        key = str(httpx.URL("/appointments", params=params))
+        entry, fresh = self.cache.lookup(key, APPOINTMENTS_CACHE_TTL)
+        if entry and not fresh:
+            # The ETag doubles as the change-feed position of the cached list
+            r = await get_client().get("/changes", params={"since": entry["etag"]})
+            if r.status_code == 200:
+                changes = r.json()
+                value = apply_changes(entry["value"], changes["events"], doctor_id)
+                last_event_id = changes["last_event_id"]
+                self.cache.store(key, f'"{last_event_id}"', value)
+                return value
+            # 410: too far behind (or the API restarted), download it again
+        return await self._cached_get("/appointments", APPOINTMENTS_CACHE_TTL, params=params)
+
+    async def find_available_slots(self, doctor_id: Optional[int] = None,
+                                   specialty: Optional[str] = None, **search: Any) -> List[Dict[str, Any]]:
+        params = {key: value for key, value in search.items() if value is not None}
+        if doctor_id is not None:
+            return [self._check(await get_client().get(f"/doctors/{doctor_id}/availability", params=params))]
+        if specialty is not None:
+            params["specialty"] = specialty
+        return self._check(await get_client().get("/availability", params=params))
+
+    async def add_appointment(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return self._check(await get_client().post("/appointments", json=payload))
+        finally:
+            self.cache.expire("/appointments")
+
+    async def add_appointments(self, payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+        try:
+            return self._check(await get_client().post("/appointments/batch", json={"appointments": payloads}))
+        finally:
+            self.cache.expire("/appointments")
+
+    async def reschedule_appointment(self, appointment_id: str, dt_string: str) -> Dict[str, Any]:
+        try:
+            return self._check(await get_client().patch(f"/appointments/{appointment_id}", json={"datetime": dt_string}))
+        finally:
+            self.cache.expire("/appointments")
+
+    async def cancel_appointment(self, appointment_id: str) -> Dict[str, Any]:
+        try:
+            return self._check(await get_client().delete(f"/appointments/{appointment_id}"))
+        finally:
+            self.cache.expire("/appointments")
+
+# Field order of api.AppointmentResponse, so in-process results print the same
+APPOINTMENT_FIELDS = ("doctor_id", "patient_name", "phone_number", "datetime", "appointment_id", "status")
+
+def as_appointment_response(appt: Any) -> Dict[str, Any]:
+    data = appt.to_dict()
+    return {field: data[field] for field in APPOINTMENT_FIELDS}
+
+def _time_order(appt: Dict[str, Any]):
+    # Same order as GET /appointments; unreadable datetimes sort first
+    try:
+        return 1, datetime.fromisoformat(appt["datetime"]), appt["appointment_id"]
+    except (TypeError, ValueError):
+        return 0, datetime.min, appt["appointment_id"]
+
+def apply_changes(appointments: List[Dict[str, Any]], events: List[Dict[str, Any]],
+                  doctor_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    A GET /appointments result (optionally for one doctor) brought up to
+    date with GET /changes events: created appointments are added,
+    rescheduled ones replaced and cancelled ones dropped, in time order.
+    Events the list already reflects are harmless.
+    """
+    # appointment_id -> newest version from the events
+    changed, cancelled = {}, set()
+    for event in events:
+        if event["type"] != "appointments":
+            continue  # archiving moves appointments but doesn't change the list
+        for appt in event["created"] + event["updated"]:
+            if doctor_id is None or appt["doctor_id"] == doctor_id:
+                changed[appt["appointment_id"]] = {field: appt[field] for field in APPOINTMENT_FIELDS}
+        cancelled.update(event["cancelled"])
+    if not changed and not cancelled:
+        return appointments
+    known = {appt["appointment_id"] for appt in appointments}
+    result = [
+        changed.get(appt["appointment_id"], appt) for appt in appointments
+        if appt["appointment_id"] not in cancelled
+    ]
+    result.extend(
+        appt for appointment_id, appt in changed.items()
+        if appointment_id not in known and appointment_id not in cancelled
+    )
+    result.sort(key=_time_order)
+    return result
+
+class InProcessTransport:
+    """
+    Calls AppointmentScheduler directly, skipping HTTP and JSON encoding.
+    Results and error messages match what api.py returns for the same call.
+    The scheduler is thread-safe, so calls run on worker threads to keep the
+    event loop free.
+    """
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    async def get_doctors(self) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.scheduler.get_all_doctors)
+
+    async def get_appointments(self, doctor_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        appointments, _ = await asyncio.to_thread(self.scheduler.query_appointments, doctor_id=doctor_id)
+        return [as_appointment_response(appt) for appt in appointments]
+
+    async def find_available_slots(self, doctor_id: Optional[int] = None,
+                                   specialty: Optional[str] = None, **search: Any) -> List[Dict[str, Any]]:
+        if doctor_id is not None and self.scheduler.get_doctor(doctor_id) is None:
+            raise APIError(404, "Error: Doctor ID not found.")
+        search = {key: value for key, value in search.items() if value is not None}
+        try:
+            return await asyncio.to_thread(
+                self.scheduler.find_available_slots, doctor_id=doctor_id, specialty=specialty, **search
+            )
+        except ValueError as e:
+            raise APIError(400, str(e))
+
+    async def add_appointment(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        success, message, new_appt = await asyncio.to_thread(
+            self.scheduler.add_appointment,
+            doctor_id=payload["doctor_id"],
+            patient_name=payload["patient_name"],
+            dt_string=payload["datetime"],
+            phone_number=payload["phone_number"]
+        )
+        if not success:
+            raise APIError(409, message)
+        return as_appointment_response(new_appt)
+
+    async def add_appointments(self, payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+        from core.schemas import AppointmentBatchRequest
+
+        # Same model as POST /appointments/batch, so items are coerced and
+        # rejected exactly as over HTTP
+        try:
+            request = AppointmentBatchRequest.model_validate({"appointments": payloads})
+        except ValidationError as e:
+            raise APIError(422, [
+                dict(error, loc=["body", *error["loc"]]) for error in json.loads(e.json(include_url=False))
+            ])
+        outcomes = await asyncio.to_thread(
+            self.scheduler.add_appointments, [appt.model_dump() for appt in request.appointments]
+        )
+        results = [
+            {"success": success, "message": message,
+             "appointment": as_appointment_response(appt) if appt else None}
+            for success, message, appt in outcomes
+        ]
+        succeeded = sum(1 for result in results if result["success"])
+        return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+    async def reschedule_appointment(self, appointment_id: str, dt_string: str) -> Dict[str, Any]:
+        success, message, appt = await asyncio.to_thread(
+            self.scheduler.reschedule_appointment, appointment_id, dt_string
+        )
+        if not success:
+            raise APIError(404 if appt is None else 409, message)
+        return as_appointment_response(appt)
+
+    async def cancel_appointment(self, appointment_id: str) -> Dict[str, Any]:
+        success, message = await asyncio.to_thread(self.scheduler.cancel_appointment, appointment_id)
+        if not success:
+            raise APIError(404, message)
+        return {"message": message}
+
+_transport = None
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        if MCP_TRANSPORT == "inprocess":
+            if str(REPO_ROOT) not in sys.path:
+                sys.path.insert(0, str(REPO_ROOT))
+            from core.scheduler import AppointmentScheduler
+            _transport = InProcessTransport(
+                AppointmentScheduler(
+                    data_folder=SCHEDULER_DATA_FOLDER,
+                    storage_mode=SCHEDULER_STORAGE,
+                    lazy_history=SCHEDULER_LAZY_HISTORY
+                )
+            )
+        elif MCP_TRANSPORT == "http":
+            _transport = HTTPTransport()
+        else:
+            raise ValueError(f"Unknown MCP_TRANSPORT: {MCP_TRANSPORT}")
+    return _transport
+
+def close_transport():
+    global _transport
+    if isinstance(_transport, InProcessTransport):
+        _transport.scheduler.close()
+    _transport = None
 
 # ------------------ TOOLS ------------------
 
 @mcp.tool()
-def add_appointment(
+async def add_appointment(
     doctor_id: int, 
     patient_name: str, 
     phone_number: str, 
@@ -32,84 +374,122 @@ def add_appointment(
     3. NEVER guess or make up a 'doctor_id'.
     """
     try:
-        r = requests.post(
-            f"{API_BASE_URL}/appointments",
-            json={
-                "doctor_id": doctor_id,
-                "patient_name": patient_name,
-                "phone_number": phone_number,
-                "datetime": datetime
-            }
+        new_appt = await get_transport().add_appointment({
+            "doctor_id": doctor_id,
+            "patient_name": patient_name,
+            "phone_number": phone_number,
+            "datetime": datetime
+        })
+        return f"✅ Appointment created: {new_appt}"
+    except (APIError, httpx.HTTPError) as e:
+        return request_error(e)
+
+@mcp.tool()
+async def add_appointments(appointments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Book several appointments in one call, e.g. a series of follow-ups.
+    Each item needs doctor_id, patient_name, phone_number and datetime
+    (ISO format YYYY-MM-DDTHH:MM), with the same precautions as
+    add_appointment. Every item is checked separately (also against the
+    other items) and the result lists which ones were booked and why the
+    others failed.
+    """
+    try:
+        return {"result": await get_transport().add_appointments(appointments)}
+    except (APIError, httpx.HTTPError) as e:
+        return {"result": request_error(e)}
+
+@mcp.tool()
+async def find_available_slots(
+    doctor_id: int = None,
+    specialty: str = None,
+    start: str = None,
+    end: str = None
+) -> Dict[str, Any]:
+    """
+    Find every open appointment slot in one call, instead of trying times
+    with add_appointment until one succeeds.
+    Give a doctor_id for one doctor, or a specialty (e.g. "Cardiologist") to
+    search all doctors of that specialty. start/end are ISO datetimes
+    (YYYY-MM-DDTHH:MM); the default is the next 7 days.
+    Each returned slot can be passed straight to add_appointment as datetime.
+    """
+    try:
+        doctors = await get_transport().find_available_slots(
+            doctor_id=doctor_id, specialty=specialty, start=start, end=end
         )
-        r.raise_for_status()
-        return f"✅ Appointment created: {r.json()}"
-    except requests.exceptions.RequestException as e:
-        return http_error_handler(e.response) if e.response else str(e)
+        return {"result": doctors}
+    except (APIError, httpx.HTTPError) as e:
+        return {"result": request_error(e)}
+
+@mcp.tool()
+async def reschedule_appointment(appointment_id: str, datetime: str) -> str:
+    """
+    Move an existing appointment to a new date or time (ISO format
+    YYYY-MM-DDTHH:MM), keeping its ID, doctor and patient.
+    Use this instead of cancel_appointment plus add_appointment: the
+    current slot is kept until the new one is confirmed, so a failed move
+    leaves the appointment as it was. Use find_available_slots to pick a
+    free time.
+    """
+    try:
+        moved = await get_transport().reschedule_appointment(appointment_id, datetime)
+        return f"✅ Appointment rescheduled: {moved}"
+    except (APIError, httpx.HTTPError) as e:
+        return request_error(e)
 
 @mcp.tool()
-def cancel_appointment(appointment_id: str) -> Dict[str, str]:
+async def cancel_appointment(appointment_id: str) -> Dict[str, str]:
     """
     Cancel an appointment by ID.
     """
     try:
-        r = requests.delete(f"{API_BASE_URL}/appointments/{appointment_id}")
-        r.raise_for_status()
+        await get_transport().cancel_appointment(appointment_id)
         return {"result": "✅ Appointment cancelled successfully"}
-    except requests.exceptions.RequestException as e:
-        return {"result": http_error_handler(e.response) if e.response else str(e)}
+    except (APIError, httpx.HTTPError) as e:
+        return {"result": request_error(e)}
 
 @mcp.tool(name="fetch_appointments")
-def fetch_appointments(doctor_id: int = None) -> Dict[str, Any]:
+async def fetch_appointments(doctor_id: int = None) -> Dict[str, Any]:
     """
     Fetch all appointments, optionally filtered by doctor_id.
     """
     try:
-        url = f"{API_BASE_URL}/appointments"
-        if doctor_id is not None:
-            url += f"?doctor_id={doctor_id}"
-        r = requests.get(url)
-        r.raise_for_status()
-        appointments = r.json()
+        appointments = await get_transport().get_appointments(doctor_id)
         return {"result": appointments}
-    except requests.exceptions.RequestException as e:
-        return {"result": http_error_handler(e.response) if e.response else str(e)}
+    except (APIError, httpx.HTTPError) as e:
+        return {"result": request_error(e)}
 
 @mcp.tool(name="fetch_doctors")
-def fetch_doctors() -> Dict[str, Any]:
+async def fetch_doctors() -> Dict[str, Any]:
     """
     Fetch all available doctors and their information.
     don't forget to use this tool to get valid doctor IDs! everytime. 
     """
     try:
-        r = requests.get(f"{API_BASE_URL}/doctors")
-        r.raise_for_status()
-        doctors = r.json()
+        doctors = await get_transport().get_doctors()
         return {"result": doctors}
-    except requests.exceptions.RequestException as e:
-        return {"result": http_error_handler(e.response) if e.response else str(e)}
+    except (APIError, httpx.HTTPError) as e:
+        return {"result": request_error(e)}
 
 # ------------------ RESOURCES (MCP Discovery API) ------------------
 
 @mcp.tool()
-def get_doctors() -> List[Dict[str, Any]]:
+async def get_doctors() -> List[Dict[str, Any]]:
     """
     Get all available doctors.
     Returns a list of doctors with their details.
     don't use chat memory to get list of doctors; always call this tool.
     """
-    r = requests.get(f"{API_BASE_URL}/doctors")
-    r.raise_for_status()
-    return r.json()
+    return await get_transport().get_doctors()
 
 @mcp.tool()
-def get_all_appointments() -> List[Dict[str, Any]]:
+async def get_all_appointments() -> List[Dict[str, Any]]:
     """
     Get all appointments.
     Returns a list of appointments with their details.
     """
-    r = requests.get(f"{API_BASE_URL}/appointments")
-    r.raise_for_status()
-    return r.json()
+    return await get_transport().get_appointments()
 # ------------------ RUN ------------------
 
 from contextlib import asynccontextmanager
@@ -119,9 +499,11 @@ from fastapi import FastAPI
 async def lifespan(app: FastAPI):
     # Startup
     print("✅ MCP Appointment Scheduler server running...")
-    print("🔗 Backend API: http://127.0.0.1:8000")
+    print(f"🔗 Backend API: {API_BASE_URL}")
     yield
     # Shutdown
+    await close_client()
+    close_transport()
     print("Shutting down...")
 
 app = FastAPI(lifespan=lifespan)